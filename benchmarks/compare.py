@@ -0,0 +1,49 @@
+"""对比两次基准测试的结果
+
+python -m benchmarks.compare results/abc1234.json results/def5678.json
+"""
+
+import sys
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Tuple
+
+# 只对比耗时与内存，其余字段为规模信息
+METRICS = ("seconds", "mean", "p50", "p95", "max", "peak_rss_mb")
+
+
+def flatten(data: dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, (int, float)) and (
+            key in METRICS or key.endswith("_seconds")
+        ):
+            yield f"{prefix}{key}", value
+
+
+def load(path: Path) -> Dict[int, Dict[str, float]]:
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return {
+        scenario["subscriptions"]: dict(flatten(scenario))
+        for scenario in data["scenarios"]
+    }
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    before, after = load(Path(sys.argv[1])), load(Path(sys.argv[2]))
+    for size in sorted(before.keys() & after.keys()):
+        print(f"\n{size} 条订阅")
+        for name, old in before[size].items():
+            new = after[size].get(name)
+            if new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0
+            print(f"  {name:<28} {old:>12.4f} -> {new:>12.4f} ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+"""构造 OneBot V11 群消息事件"""
+
+import time
+
+from nonebot.adapters.onebot.v11 import GroupMessageEvent, Message
+from nonebot.adapters.onebot.v11.event import Sender
+
+
+def group_message(
+    text: str, user_id: str, group_id: str, message_id: int, self_id: str = "1"
+) -> GroupMessageEvent:
+    return GroupMessageEvent(
+        time=int(time.time()),
+        self_id=int(self_id),
+        post_type="message",
+        sub_type="normal",
+        user_id=int(user_id),
+        message_type="group",
+        message_id=message_id,
+        message=Message(text),
+        original_message=Message(text),
+        raw_message=text,
+        font=0,
+        sender=Sender(user_id=int(user_id)),
+        to_me=False,
+        group_id=int(group_id),
+    )
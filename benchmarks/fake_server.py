@@ -0,0 +1,174 @@
+"""本地模拟的 MyAnimeList 与 Jikan API，用于离线基准测试"""
+
+import random
+import asyncio
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from aiohttp import web
+from PIL import Image
+
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SEASONS = ["winter", "spring", "summer", "fall"]
+
+
+def _make_cover() -> bytes:
+    output = BytesIO()
+    Image.new("RGB", (225, 320), (200, 80, 80)).save(output, "JPEG")
+    return output.getvalue()
+
+
+COVER = _make_cover()
+
+
+def anime_id(year: int, season: str, index: int) -> int:
+    # 每个季度的番剧 ID 互不重叠
+    return ((year - 1900) * 4 + SEASONS.index(season)) * 100000 + index + 1
+
+
+def make_node(id: int, year: int, season: str, base_url: str) -> dict:
+    rng = random.Random(id)
+    return {
+        "id": id,
+        "title": f"Synthetic Anime {id}",
+        "main_picture": {
+            "medium": f"{base_url}/images/{id}m.jpg",
+            "large": f"{base_url}/images/{id}l.jpg",
+        },
+        "alternative_titles": {
+            "synonyms": [f"SA{id}"],
+            "en": f"Synthetic Anime {id}",
+            "ja": f"合成アニメ {id}",
+        },
+        "start_date": f"{year}-{SEASONS.index(season) * 3 + 1:02d}-0{rng.randint(1, 9)}",
+        "end_date": "",
+        "media_type": "tv",
+        "status": "currently_airing",
+        "num_episodes": rng.choice([12, 13, 24, 0]),
+        "start_season": {"year": year, "season": season},
+        "broadcast": {
+            "day_of_the_week": rng.choice(DAYS),
+            "start_time": f"{rng.randint(0, 23):02d}:{rng.choice([0, 30]):02d}",
+        },
+    }
+
+
+def make_detail(id: int, base_url: str) -> dict:
+    year = 1900 + id // 100000 // 4
+    season = SEASONS[id // 100000 % 4]
+    rng = random.Random(id)
+    return {
+        **make_node(id, year, season, base_url),
+        "synopsis": "Lorem ipsum " * 40,
+        "rank": rng.randint(1, 20000),
+        "source": "manga",
+        "average_episode_duration": 1440,
+        "background": "",
+        "studios": [{"id": rng.randint(1, 500), "name": "Studio"}],
+        "statistics": {
+            "status": {
+                "watching": str(rng.randint(0, 100000)),
+                "completed": str(rng.randint(0, 100000)),
+                "on_hold": str(rng.randint(0, 1000)),
+                "dropped": str(rng.randint(0, 1000)),
+                "plan_to_watch": str(rng.randint(0, 100000)),
+            },
+            "num_list_users": rng.randint(0, 300000),
+        },
+    }
+
+
+class FakeUpstream:
+    """模拟上游 API，每个请求固定延迟 `latency` 秒，每个季度有 `season_size` 部番剧"""
+
+    def __init__(self, latency: float = 0.0, season_size: int = 500) -> None:
+        self.latency = latency
+        self.season_size = season_size
+        self.requests: Dict[str, int] = {
+            "season": 0,
+            "detail": 0,
+            "search": 0,
+            "image": 0,
+        }
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def _delay(self) -> None:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    async def season(self, request: web.Request) -> web.Response:
+        self.requests["season"] += 1
+        await self._delay()
+        year = int(request.match_info["year"])
+        season = request.match_info["season"]
+        limit = int(request.query.get("limit", 100))
+        offset = int(request.query.get("offset", 0))
+
+        end = min(offset + limit, self.season_size)
+        paging = {}
+        if end < self.season_size:
+            query = dict(request.query, offset=str(end))
+            paging["next"] = str(request.url.with_query(query))
+        return web.json_response(
+            {
+                "data": [
+                    {
+                        "node": make_node(
+                            anime_id(year, season, i), year, season, self.base_url
+                        )
+                    }
+                    for i in range(offset, end)
+                ],
+                "paging": paging,
+                "season": {"year": year, "season": season},
+            }
+        )
+
+    async def detail(self, request: web.Request) -> web.Response:
+        self.requests["detail"] += 1
+        await self._delay()
+        return web.json_response(
+            make_detail(int(request.match_info["id"]), self.base_url)
+        )
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests["search"] += 1
+        await self._delay()
+        limit = int(request.query.get("limit", 10))
+        data: List[dict] = [
+            {
+                "mal_id": i + 1,
+                "title": f"{request.query.get('q', '')} {i}",
+                "title_japanese": None,
+                "images": {
+                    "jpg": {"large_image_url": f"{self.base_url}/images/{i + 1}l.jpg"}
+                },
+            }
+            for i in range(limit)
+        ]
+        return web.json_response({"data": data})
+
+    async def image(self, request: web.Request) -> web.Response:
+        self.requests["image"] += 1
+        await self._delay()
+        return web.Response(body=COVER, content_type="image/jpeg")
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get("/v2/anime/season/{year}/{season}", self.season)
+        app.router.add_get("/v2/anime/{id}", self.detail)
+        app.router.add_get("/v4/anime", self.search)
+        app.router.add_get("/images/{name}", self.image)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]  # type: ignore
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,305 @@
+"""基于 nonebug 的并发压测，模拟大量群同时发送插件命令
+
+    python -m benchmarks.load --groups 500 --concurrency 500 --requests 2000 \\
+        --mix search=4,subscribe=2,unsubscribe=1,my=3 --latency 0.02
+
+报告各命令的 p50/p95/p99 延迟、吞吐量、事件循环延迟与数据库锁争用，
+并写入 `benchmarks/results/load-<git 版本>.json`。
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import nonebot
+
+from .seed import seed_users_db
+from .events import group_message
+from .fake_server import FakeUpstream
+from .run import RESULTS_DIR, git_revision
+
+COMMANDS = {
+    "search": "搜索番剧",
+    "subscribe": "订阅番剧",
+    "unsubscribe": "取消订阅番剧",
+    "my": "我的订阅",
+}
+
+
+def quantiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "max": None}
+    samples = sorted(samples)
+
+    def pick(q: float) -> float:
+        return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99), "max": samples[-1]}
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"未知的命令: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoopLagMonitor:
+    """每隔 `interval` 秒唤醒一次，记录实际唤醒时间比预期晚了多少"""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(loop.time() - expected, 0))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+def make_workload(
+    args: argparse.Namespace, animes: int, rng: random.Random
+) -> List[Tuple[str, str, str, str]]:
+    """生成 (命令类型, 消息文本, 用户, 群) 列表"""
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    workload = []
+    for _ in range(args.requests):
+        kind = rng.choices(names, weights)[0]
+        anime_id = rng.randint(1, animes)
+        if kind == "search":
+            # 大部分命中本地索引，少量需要请求 Jikan，部分直接按 ID 查询
+            argument = rng.choice(
+                [
+                    f"Synthetic Anime {anime_id}",
+                    f"合成アニメ {anime_id}",
+                    str(anime_id),
+                    f"unknown title {rng.random()}",
+                ]
+            )
+        elif kind in ("subscribe", "unsubscribe"):
+            argument = str(anime_id)
+        else:
+            argument = ""
+        text = f"/{COMMANDS[kind]} {argument}".rstrip()
+        user_id = str(10000 + rng.randrange(args.users))
+        group_id = str(20000 + rng.randrange(args.groups))
+        workload.append((kind, text, user_id, group_id))
+    return workload
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from nonebot.matcher import matchers
+    from nonebot.message import run_postprocessor
+    from nonebug import App
+    from nonebug.provider import NoneBugProvider
+
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="anime-load-"))
+    upstream = FakeUpstream(args.latency, args.season_size)
+    base_url = await upstream.start()
+
+    # 与 nonebug 的 pytest 插件相同的初始化
+    nonebot.init(
+        driver="~none",
+        mal_client_id="benchmark",
+        localstore_data_dir=str(data_dir / "data"),
+        localstore_cache_dir=str(data_dir / "cache"),
+        localstore_config_dir=str(data_dir / "config"),
+        log_level="WARNING",
+        anime_mal_rate_limit=args.upstream_rate,
+        anime_mal_burst=args.upstream_rate,
+        anime_jikan_rate_limit=args.upstream_rate,
+        anime_jikan_burst=args.upstream_rate,
+        anime_request_concurrency=64,
+    )
+    matchers.set_provider(NoneBugProvider)
+    from nonebot.adapters.onebot.v11 import Adapter, Bot
+
+    nonebot.get_driver().register_adapter(Adapter)
+    plugin = nonebot.load_plugin("nonebot_plugin_anime_notification")
+    assert plugin is not None
+    module = plugin.module
+    module.mal_api._base_url = f"{base_url}/v2"
+    module.jikan_api._base_url = f"{base_url}/v4"
+    from nonebot_plugin_anime_notification.metrics import (
+        DB_COMMIT_LATENCY,
+        DB_WRITE_BATCH,
+        DB_WRITE_WAIT,
+        registry,
+    )
+
+    animes = max(args.subscriptions // 10, 1)
+    seed_users_db(
+        module.data_file,
+        args.subscriptions,
+        animes=animes,
+        groups=args.groups,
+        image_base=base_url,
+    )
+    await nonebot.get_driver()._lifespan.startup()
+    await module.warm_up_task
+
+    # 统计数据库锁争用与处理器中未捕获的异常
+    lock_errors = 0
+    handler_errors = 0
+
+    def on_db_error(context) -> None:
+        nonlocal lock_errors
+        if "database is locked" in str(context.original_exception):
+            lock_errors += 1
+
+    from sqlalchemy import event
+
+    for engine in (module.engine, module.anime_summary_engine):
+        event.listen(engine.sync_engine, "handle_error", on_db_error)
+    # 写操作由写入线程通过同步引擎执行
+    for engine in (module.users_write_engine, module.summary_write_engine):
+        event.listen(engine, "handle_error", on_db_error)
+
+    @run_postprocessor
+    async def count_errors(exception: Optional[Exception]) -> None:
+        nonlocal handler_errors
+        if exception is not None:
+            handler_errors += 1
+
+    class LoadBot(Bot):
+        async def call_api(self, api: str, **data):
+            return {"message_id": 1}
+
+    rng = random.Random(args.seed)
+    workload = make_workload(args, animes, rng)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    monitor = LoopLagMonitor()
+    registry.reset()
+
+    app = App()
+    async with app.test_api() as ctx:
+        bots = [
+            ctx.create_bot(
+                base=LoadBot, adapter=nonebot.get_adapter(Adapter), self_id=str(i + 1)
+            )
+            for i in range(args.bots)
+        ]
+
+        async def issue(index: int, kind: str, text: str, user: str, group: str):
+            bot = bots[int(group) % len(bots)]
+            event = group_message(text, user, group, index, self_id=bot.self_id)
+            async with semaphore:
+                start = time.perf_counter()
+                await bot.handle_event(event)
+                latencies[kind].append(time.perf_counter() - start)
+
+        monitor.start()
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(issue(i, *request) for i, request in enumerate(workload))
+        )
+        elapsed = time.perf_counter() - start
+        await monitor.stop()
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": int(time.time()),
+        "params": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("data_dir", "output")
+        },
+        "elapsed_seconds": elapsed,
+        "throughput": len(workload) / elapsed,
+        "commands": {
+            kind: {"count": len(samples), **quantiles(samples)}
+            for kind, samples in latencies.items()
+        },
+        "loop_lag": quantiles(monitor.samples),
+        "db": {
+            "lock_errors": lock_errors,
+            **{
+                key: {
+                    db: {
+                        q: metric.quantile(value, db=db)
+                        for q, value in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+                    }
+                    for db in ("users", "summary")
+                }
+                for key, metric in (
+                    ("commit", DB_COMMIT_LATENCY),
+                    ("write_wait", DB_WRITE_WAIT),
+                    ("write_batch", DB_WRITE_BATCH),
+                )
+            },
+        },
+        "handler_errors": handler_errors,
+        "upstream_requests": upstream.requests,
+    }
+
+    await nonebot.get_driver()._lifespan.shutdown()
+    await upstream.stop()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=500, help="发送命令的群数")
+    parser.add_argument("--users", type=int, default=2000, help="发送命令的用户数")
+    parser.add_argument("--bots", type=int, default=2, help="机器人账号数")
+    parser.add_argument("--requests", type=int, default=2000, help="命令总数")
+    parser.add_argument("--concurrency", type=int, default=500, help="同时处理的命令数")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default="search=4,subscribe=2,unsubscribe=1,my=3",
+        help="各命令的权重",
+    )
+    parser.add_argument("--subscriptions", type=int, default=10000, help="预置的订阅数")
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="模拟上游的延迟（秒）"
+    )
+    parser.add_argument("--season-size", type=int, default=500)
+    parser.add_argument(
+        "--upstream-rate", type=float, default=1000, help="上游每秒允许的请求数"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir")
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    output = args.output or RESULTS_DIR / f"load-{report['revision'] or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8"
+    )
+    # 压测中出现处理器异常或数据库锁错误视为失败
+    if report["handler_errors"] or report["db"]["lock_errors"]:
+        sys.exit(
+            f"handler_errors={report['handler_errors']}, "
+            f"lock_errors={report['db']['lock_errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""运行全部规模的基准测试并将结果写入 JSON
+
+python -m benchmarks.run --sizes 1000 10000 100000 --latency 0.02
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_scenario(subscriptions: int, args: argparse.Namespace) -> dict:
+    # 每个规模使用独立的进程，导入耗时与内存峰值互不影响
+    output = subprocess.check_output(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.scenario",
+            "--subscriptions",
+            str(subscriptions),
+            "--latency",
+            str(args.latency),
+            "--season-size",
+            str(args.season_size),
+            "--page-size",
+            str(args.page_size),
+            "--rounds",
+            str(args.rounds),
+        ],
+        text=True,
+        cwd=Path(__file__).parent.parent,
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="模拟上游的延迟（秒）"
+    )
+    parser.add_argument("--season-size", type=int, default=500, help="每个季度的番剧数")
+    parser.add_argument("--page-size", type=int, default=100, help="季度番剧每页的数量")
+    parser.add_argument("--rounds", type=int, default=50, help="`我的订阅` 的测量次数")
+    parser.add_argument("--output", type=Path, help="默认为 results/<git 版本>.json")
+    args = parser.parse_args(argv)
+
+    revision = git_revision()
+    results = {
+        "revision": revision,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "latency": args.latency,
+            "season_size": args.season_size,
+            "page_size": args.page_size,
+            "rounds": args.rounds,
+        },
+        "scenarios": [],
+    }
+    for size in args.sizes:
+        print(f"正在测量 {size} 条订阅...", file=sys.stderr)
+        scenario = run_scenario(size, args)
+        results["scenarios"].append(scenario)
+        print(json.dumps(scenario, indent=2), file=sys.stderr)
+
+    output = args.output or RESULTS_DIR / f"{revision or 'local'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"结果已写入 {output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
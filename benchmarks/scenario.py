@@ -0,0 +1,188 @@
+"""在独立进程中加载插件并测量单个规模下的各项耗时，结果以 JSON 输出到 stdout
+
+由 `benchmarks.run` 调用，也可单独运行:
+
+    python -m benchmarks.scenario --subscriptions 10000
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import nonebot
+from sqlalchemy import delete, func, select
+
+from .seed import seed_users_db
+from .fake_server import FakeUpstream
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        "mean": statistics.mean(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(int(len(samples) * 0.95), len(samples) - 1)],
+        "max": samples[-1],
+    }
+
+
+async def measure_my_subscriptions(
+    user_id: str, group_id: str, rounds: int
+) -> List[float]:
+    from nonebot.message import handle_event
+    from nonebot.adapters.onebot.v11 import Adapter, Bot
+
+    from .events import group_message
+
+    sent = asyncio.Event()
+
+    class BenchBot(Bot):
+        async def call_api(self, api: str, **data):
+            sent.set()
+            return {"message_id": 1}
+
+    bot = BenchBot(nonebot.get_adapter(Adapter), "1")
+    timings = []
+    for i in range(rounds):
+        event = group_message("/我的订阅", user_id, group_id, i)
+        sent.clear()
+        start = time.perf_counter()
+        await handle_event(bot, event)
+        await asyncio.wait_for(sent.wait(), 30)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+async def run(args: argparse.Namespace) -> dict:
+    data_dir = Path(args.data_dir or tempfile.mkdtemp(prefix="anime-bench-"))
+    upstream = FakeUpstream(args.latency, args.season_size)
+    base_url = await upstream.start()
+
+    nonebot.init(
+        driver="~none",
+        mal_client_id="benchmark",
+        localstore_data_dir=str(data_dir / "data"),
+        localstore_cache_dir=str(data_dir / "cache"),
+        localstore_config_dir=str(data_dir / "config"),
+        log_level="WARNING",
+        anime_season_page_size=args.page_size,
+        # 测量插件自身的开销，不受上游限速影响
+        anime_mal_rate_limit=10000,
+        anime_mal_burst=10000,
+        anime_request_concurrency=64,
+    )
+    from nonebot.adapters.onebot.v11 import Adapter
+
+    nonebot.get_driver().register_adapter(Adapter)
+
+    result: dict = {"subscriptions": args.subscriptions}
+
+    start = time.perf_counter()
+    plugin = nonebot.load_plugin("nonebot_plugin_anime_notification")
+    result["import_seconds"] = time.perf_counter() - start
+    assert plugin is not None
+    module = plugin.module
+    from nonebot_plugin_anime_notification.notice import Notification
+    from nonebot_plugin_anime_notification.data_source import AnimeGroup, FetchedSeason
+
+    module.mal_api._base_url = f"{base_url}/v2"
+    module.jikan_api._base_url = f"{base_url}/v4"
+
+    start = time.perf_counter()
+    seed_users_db(
+        module.data_file,
+        args.subscriptions,
+        animes=max(args.subscriptions // 10, 1),
+        groups=max(args.subscriptions // 50, 1),
+        image_base=base_url,
+    )
+    result["seed_seconds"] = time.perf_counter() - start
+
+    # 启动：建表迁移 + 后台预热（含首次爬取）
+    start = time.perf_counter()
+    await nonebot.get_driver()._lifespan.startup()
+    result["startup_seconds"] = time.perf_counter() - start
+    await module.warm_up_task
+    result["warm_up_seconds"] = time.perf_counter() - start
+
+    # 重新爬取全部季度
+    async with module.AnimeSummarySession() as session:
+        async with session.begin():
+            await session.execute(delete(FetchedSeason))
+    upstream.requests["season"] = 0
+    start = time.perf_counter()
+    await module.fetch_anime()
+    result["ingest"] = {
+        "seconds": time.perf_counter() - start,
+        "pages": upstream.requests["season"],
+        "rows": 3 * args.season_size,
+    }
+
+    # 重建通知索引
+    notification = Notification([], module.outbox.enqueue)
+    module.notification, previous = notification, module.notification
+    start = time.perf_counter()
+    async with module.Session() as session:
+        await module.load_notifications(session)
+    await notification.update_notification()
+    result["rebuild"] = {
+        "seconds": time.perf_counter() - start,
+        "subscriptions": len(notification),
+        "jobs": len(notification.scheduler.get_jobs()),
+    }
+    notification.scheduler.shutdown(wait=False)
+    module.notification = previous
+
+    # 在同一个群中订阅最多的用户
+    async with module.Session() as session:
+        user_id, group_id, count = (
+            await session.execute(
+                select(AnimeGroup.user_id, AnimeGroup.group_id, func.count())
+                .group_by(AnimeGroup.user_id, AnimeGroup.group_id)
+                .order_by(func.count().desc())
+                .limit(1)
+            )
+        ).one()
+    timings = await measure_my_subscriptions(user_id, group_id, args.rounds)
+    result["my_subscriptions"] = {"subscriptions": count, **summarize(timings)}
+
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    await nonebot.get_driver()._lifespan.shutdown()
+    await upstream.stop()
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--season-size", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--data-dir")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args))))
+
+
+if __name__ == "__main__":
+    main()
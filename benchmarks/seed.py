@@ -0,0 +1,109 @@
+"""生成带有大量订阅的合成 users.db"""
+
+import time
+import random
+from pathlib import Path
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, insert, text
+
+from .fake_server import DAYS
+
+BATCH_SIZE = 5000
+
+
+def seed_users_db(
+    path: Path,
+    subscriptions: int,
+    animes: int,
+    groups: int,
+    image_base: str,
+    seed: int = 0,
+) -> None:
+    """写入 `animes` 部番剧与分布在 `groups` 个群中的 `subscriptions` 条订阅
+
+    订阅集中在少数热门番剧上，接近真实的分布。需在插件加载后调用。
+    """
+    from nonebot_plugin_anime_notification.data_source import (
+        USERS_DB_MIGRATIONS,
+        AnimeDetailData,
+        AnimeGroup,
+        AnimeStatistics,
+        Base,
+        User,
+    )
+
+    rng = random.Random(seed)
+    now = int(time.time())
+    start = date.today() - timedelta(weeks=4)
+
+    engine = create_engine(f"sqlite:///{path.resolve()}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(text(f"PRAGMA user_version = {len(USERS_DB_MIGRATIONS)}"))
+        connection.execute(
+            insert(AnimeDetailData),
+            [
+                {
+                    "id": anime_id,
+                    "title": f"Synthetic Anime {anime_id}",
+                    "display_title": f"合成アニメ {anime_id}",
+                    "picture_url": f"{image_base}/images/{anime_id}l.jpg",
+                    "picture_medium_url": f"{image_base}/images/{anime_id}m.jpg",
+                    "alternative_titles": "{}",
+                    "start_date": (start + timedelta(days=anime_id % 7)).isoformat(),
+                    "end_date": "",
+                    "synopsis": "",
+                    "broadcast_day": DAYS[anime_id % 7],
+                    "broadcast_time": f"{anime_id % 24:02d}:{anime_id % 2 * 30:02d}",
+                    "media_type": "tv",
+                    "status": "currently_airing",
+                    "num_episodes": 24,
+                    "season_year": start.year,
+                    "season_name": "fall",
+                    "source": "manga",
+                    "average_episode_duration": 1440,
+                    "background": "",
+                    "last_update": now,
+                }
+                for anime_id in range(1, animes + 1)
+            ],
+        )
+        connection.execute(
+            insert(AnimeStatistics),
+            [
+                {
+                    "anime_id": anime_id,
+                    "watching": rng.randint(0, 100000),
+                    "completed": rng.randint(0, 100000),
+                    "on_hold": rng.randint(0, 1000),
+                    "dropped": rng.randint(0, 1000),
+                    "plan_to_watch": rng.randint(0, 100000),
+                    "num_list_users": rng.randint(0, 300000),
+                }
+                for anime_id in range(1, animes + 1)
+            ],
+        )
+
+        users = max(subscriptions // 5, 1)
+        connection.execute(
+            insert(User), [{"user_id": str(10000 + i)} for i in range(users)]
+        )
+
+        seen = set()
+        while len(seen) < subscriptions:
+            seen.add(
+                (
+                    str(10000 + rng.randrange(users)),
+                    # 幂律分布，少数番剧拥有大部分订阅
+                    min(int(rng.paretovariate(1.2)), animes),
+                    str(20000 + rng.randrange(groups)),
+                )
+            )
+        rows = [
+            {"user_id": user_id, "anime_id": anime_id, "group_id": group_id}
+            for user_id, anime_id, group_id in seen
+        ]
+        for i in range(0, len(rows), BATCH_SIZE):
+            connection.execute(insert(AnimeGroup), rows[i : i + BATCH_SIZE])
+    engine.dispose()
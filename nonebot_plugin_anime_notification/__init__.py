@@ -1,12 +1,14 @@
-import json
+import time
+import asyncio
 import nonebot
 from pathlib import Path
 from datetime import datetime
 from nonebot.log import logger
-from typing import List, Awaitable
+from typing import Any, Dict, List, Optional
 from nonebot.params import CommandArg
-from datetime import datetime, timedelta
+from nonebot.permission import SUPERUSER
 from nonebot.adapters import Event, Bot, Message
+from nonebot.message import event_preprocessor
 from nonebot import require, get_driver, on_command
 
 require("nonebot_plugin_alconna")
@@ -14,31 +16,61 @@ require("nonebot_plugin_localstore")
 require("nonebot_plugin_apscheduler")
 
 import nonebot_plugin_localstore as store
-from nonebot_plugin_alconna import UniMessage, Image, Text, At, Target
+from nonebot_plugin_alconna import UniMessage, Image, Text, At
 from nonebot_plugin_apscheduler import scheduler
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import Session as SyncSession, sessionmaker
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 
 from .config import Config
 from .utils import fetch_url
+from .client import HttpClient
+from .image_cache import ImageCache
+from .response_cache import ResponseCache
 from .notice import Notification
-from .api import MyAnimeList, Jikan
-from .models.myanimelist import Season, AnimeData
-from .maps import (
-    media_type_map,
-    status_map,
-    source_map,
-    season_cn_map,
-    day_of_the_week_map,
+from .delivery import Delivery
+from .outbox import Outbox
+from .writer import Writer, enable_wal
+from .airing import AiringSchedule
+from .render import CardCache
+from .collage import render_collage
+from .metrics import (
+    registry,
+    dump_metrics,
+    timed_session_class,
+    start_metrics_server,
+)
+from .search import TitleIndex, load_detail_rows, load_summary_rows
+from .ingest import (
+    IngestStats,
+    missing_seasons,
+    upcoming_seasons,
+    upsert_seasonal_page,
+    record_fetched_season,
 )
+from .api import MyAnimeList, Jikan
+from .refresh import DetailRefresher
+from .models.myanimelist import AnimeDetail
+from .maps import season_cn_map, day_of_the_week_map
 from .data_source import (
     User,
     Base,
     AnimeGroup,
+    GroupRoute,
     AnimeDetailData,
     AnimeSummaryBase,
     AnimeSummaryData,
+    upgrade_users_db,
+    upgrade_summary_db,
+    apply_anime_detail,
+    build_anime_detail,
 )
 
 
@@ -54,256 +86,637 @@ anime_summary_data_file: Path = store.get_data_file(
 )
 
 
-engine = create_engine(f"sqlite:///{data_file.resolve()}")
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
-session = Session()
+# 每个处理器使用独立的会话，连接池大小有上限
+engine = create_async_engine(
+    f"sqlite+aiosqlite:///{data_file.resolve()}",
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.anime_db_pool_size,
+    max_overflow=config.anime_db_max_overflow,
+)
+enable_wal(engine.sync_engine)
+Session = async_sessionmaker(
+    engine, expire_on_commit=False, sync_session_class=timed_session_class("users")
+)
 
-anime_summary_engine = create_engine(f"sqlite:///{anime_summary_data_file.resolve()}")
-AnimeSummaryBase.metadata.create_all(anime_summary_engine)
-AnimeSummarySession = sessionmaker(bind=anime_summary_engine)
-anime_summary_session = AnimeSummarySession()
+anime_summary_engine = create_async_engine(
+    f"sqlite+aiosqlite:///{anime_summary_data_file.resolve()}",
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.anime_db_pool_size,
+    max_overflow=config.anime_db_max_overflow,
+)
+enable_wal(anime_summary_engine.sync_engine)
+AnimeSummarySession = async_sessionmaker(
+    anime_summary_engine,
+    expire_on_commit=False,
+    sync_session_class=timed_session_class("summary"),
+)
 
-mal_api = MyAnimeList(config.mal_client_id)
-jikan_api = Jikan()
+# 所有写操作经由各数据库唯一的写入线程，短时间内的写操作合并为一个事务
+users_write_engine = create_engine(f"sqlite:///{data_file.resolve()}")
+enable_wal(users_write_engine)
+users_writer = Writer(
+    "users",
+    sessionmaker(
+        users_write_engine,
+        expire_on_commit=False,
+        class_=timed_session_class("users"),
+    ),
+    config.anime_db_write_interval,
+    config.anime_db_write_batch,
+)
 
-season_map = {0: "winter", 1: "spring", 2: "summer", 3: "fall"}
-season_index_map = {v: k for k, v in season_map.items()}
+summary_write_engine = create_engine(f"sqlite:///{anime_summary_data_file.resolve()}")
+enable_wal(summary_write_engine)
+summary_writer = Writer(
+    "summary",
+    sessionmaker(
+        summary_write_engine,
+        expire_on_commit=False,
+        class_=timed_session_class("summary"),
+    ),
+    config.anime_db_write_interval,
+    config.anime_db_write_batch,
+)
 
+http_client = HttpClient(config)
+get_driver().on_startup(http_client.startup)
+get_driver().on_shutdown(http_client.shutdown)
 
-def get_time_info(dt: datetime):
-    year = dt.year
-    season = season_map[(dt.month - 1) // 3]
-    return {"year": year, "season": season}
+image_cache = ImageCache(
+    http_client,
+    store.get_data_dir("nonebot_plugin_anime_notification") / "images",
+    max_disk_bytes=config.anime_image_cache_size * 1024 * 1024,
+    max_memory_bytes=config.anime_image_memory_cache_size * 1024 * 1024,
+    ttl=config.anime_image_cache_ttl,
+)
 
+response_cache = ResponseCache(http_client, config.anime_http_cache_size)
+mal_api = MyAnimeList(
+    config.mal_client_id, response_cache, detail_ttl=config.anime_mal_detail_cache_ttl
+)
+jikan_api = Jikan(response_cache, search_ttl=config.anime_jikan_search_cache_ttl)
 
-async def build_anime_info_message(anime_detail: AnimeDetailData) -> UniMessage:
-    main_picture = json.loads(anime_detail.main_picture)
-    alternative_titles = json.loads(anime_detail.alternative_titles)
-    start_season = json.loads(anime_detail.start_season)
-    studios = json.loads(anime_detail.studios)
-    statistics = json.loads(anime_detail.statistics)
-    broadcast = json.loads(anime_detail.broadcast)
+title_index = TitleIndex()
+card_cache = CardCache(config.anime_card_cache_size)
 
-    msg = UniMessage()
 
-    msg += Image(raw=await fetch_url(main_picture["large"]))
-    msg += f"{alternative_titles.get('ja') or alternative_titles.get('en') or alternative_titles['synonyms'][0]}\n"
-    msg += f"共 {anime_detail.num_episodes} 集, {status_map[anime_detail.status]}\n"
-    msg += f"开始放送时间: {anime_detail.start_date}, 是 {start_season['year']} 年 {season_cn_map[start_season['season']]}季番\n" if start_season["year"] != "unknown" else "开始放送时间: 未知\n"
-    msg += f"放送时间: 每{day_of_the_week_map[broadcast['day_of_the_week']]} {broadcast['start_time']}\n" if broadcast["day_of_the_week"] != "unknown" else "放送时间: 未知\n"
-    msg += f"类型: {source_map[anime_detail.source]} {media_type_map[anime_detail.media_type]}\n"
-    msg += (
-        f"每集平均时长: {round(anime_detail.average_episode_duration / 60, 2)} 分钟\n"
+async def save_group_route(group_id: str, bot_id: str):
+    stmt = insert(GroupRoute).values(
+        group_id=group_id, bot_id=bot_id, last_seen=int(time.time())
     )
-    msg += f"制作公司: {', '.join([studio['name'] for studio in studios])}\n"
-    msg += f"观看详情: {statistics['status']['watching']} 正在观看, {statistics['status']['completed']} 已观看, {statistics['status']['on_hold']} 暂时搁置, {statistics['status']['dropped']} 弃坑, {statistics['status']['plan_to_watch']} 计划观看\n"
-    msg += f"共 {statistics['num_list_users']} 人观看"
-    return msg
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[GroupRoute.group_id, GroupRoute.bot_id],
+        set_={"last_seen": stmt.excluded.last_seen},
+    )
+    await users_writer.submit(lambda session: session.execute(stmt))
 
 
-def build_notice_func(anime_group: AnimeGroup) -> Awaitable:
-    async def none():
-        return None
+delivery = Delivery(
+    config.anime_send_rate_limit,
+    config.anime_send_burst,
+    config.anime_send_concurrency,
+    save_route=save_group_route,
+)
 
-    anime_detail = (
-        session.query(AnimeDetailData).filter_by(id=anime_group.anime_id).first()
-    )
-    if anime_detail is None:
-        return none
 
-    user_id = anime_group.user_id
-    group_id = anime_group.group_id
+@event_preprocessor
+async def record_group_route(bot: Bot, event: Event):
+    # 从收到的群消息中学习哪些机器人可以发送到哪些群
+    if event.get_type() != "message":
+        return
+    try:
+        target = UniMessage.get_target(event, bot)
+    except Exception:
+        return
+    if not target.private:
+        delivery.learn_route(target.id or target.parent_id, bot.self_id)
 
-    target = Target(group_id, "", False, False)
 
-    async def inner():
-        bot = nonebot.get_bot()
+async def build_anime_info_message(anime_detail: AnimeDetailData) -> UniMessage:
+    card = card_cache.get(anime_detail)
 
-        now = datetime.now()
+    msg = UniMessage()
 
-        start_time = (
-            datetime.strptime(anime_detail.start_date, "%Y-%m-%d")
-            if anime_detail.start_date != ""
-            else datetime.now()
-        )
-        end_time = (
-            datetime.strptime(anime_detail.end_date, "%Y-%m-%d")
-            if anime_detail.end_date != ""
-            else datetime.now()
-        )
+    # 没有封面或封面获取失败时只发送文字
+    if (image := await fetch_image(card.picture_url)) is not None:
+        msg += Image(raw=image)
+    msg += card.text
+    return msg
 
-        if not (start_time <= now <= end_time):
-            return None
 
-        alternative_titles = json.loads(anime_detail.alternative_titles)
-        msg = At("user", user_id) + Text(
-            f"你订阅的番剧: {alternative_titles.get('ja') or alternative_titles.get('en') or alternative_titles['synonyms'][0]} 开始放送啦！"
-        )
-        await msg.send(target, bot)
+async def send_notification(
+    group_id: str,
+    subscriptions: Dict[int, List[str]],
+    episodes: Dict[int, Optional[int]],
+):
+    # 同一时刻该群所有订阅合并为一条消息，@ 所有订阅者
+    async with Session() as session:
+        anime_details = (
+            await session.scalars(
+                select(AnimeDetailData).where(
+                    AnimeDetailData.id.in_(subscriptions.keys())
+                )
+            )
+        ).all()
 
-    return inner
+    msg = UniMessage()
+    for anime_detail in anime_details:
+        if is_stale(anime_detail):
+            detail_refresher.schedule(anime_detail.id)
+
+        for user_id in subscriptions[anime_detail.id]:
+            msg += At("user", user_id)
+        if (episode := episodes.get(anime_detail.id)) is not None:
+            msg += Text(
+                f" 你订阅的番剧: {anime_detail.display_title} 第 {episode} 集开始放送啦！\n"
+            )
+        else:
+            msg += Text(f" 你订阅的番剧: {anime_detail.display_title} 开始放送啦！\n")
+
+    if len(msg) == 0:
+        return None
+
+    await delivery.send(group_id, msg)
 
 
 async def is_group(event: Event, bot: Bot) -> bool:
     return not UniMessage.get_target(event, bot).private
 
 
-async def get_animes_by_title(title: str) -> List[int]:
-    animes = await jikan_api.get_anime_search(title, limit=3)
-    return [
-        {
-            "id": anime["mal_id"],
-            "title": anime["title_japanese"],
-            "image": await fetch_url(anime["images"]["jpg"]["large_image_url"]),
-        }
-        for anime in animes["data"]
+async def get_animes_by_title(title: str) -> List[dict]:
+    # 优先使用本地索引，最佳匹配分数不足时再请求 Jikan
+    animes = [
+        {"id": anime.id, "title": anime.title, "image_url": anime.image_url}
+        for anime, _ in title_index.search(
+            title, limit=3, score_cutoff=config.anime_search_threshold
+        )
     ]
+    if not animes:
+        animes = [
+            {
+                "id": anime["mal_id"],
+                "title": anime["title_japanese"] or anime["title"],
+                "image_url": anime["images"]["jpg"]["large_image_url"],
+            }
+            for anime in (await jikan_api.get_anime_search(title, limit=3))["data"]
+        ]
+    return animes
 
 
-async def commit_anime_detail_data(
-    anime_id: int, anime_detail_dict: dict
-) -> AnimeDetailData:
-    if (
-        anime_detail := session.query(AnimeDetailData).filter_by(id=anime_id).first()
-    ) is not None:
-        return anime_detail
-
-    anime_detail = AnimeDetailData(
-        id=anime_id,
-        title=anime_detail_dict["title"],
-        main_picture=json.dumps(anime_detail_dict["main_picture"]),
-        alternative_titles=json.dumps(anime_detail_dict["alternative_titles"]),
-        start_date=anime_detail_dict["start_date"],
-        synopsis=anime_detail_dict["synopsis"],
-        broadcast=json.dumps(
-            anime_detail_dict.get(
-                "broadcast", {"day_of_the_week": "unknown", "start_time": "00:00"}
-            )
-        ),
-        media_type=anime_detail_dict["media_type"],
-        status=anime_detail_dict["status"],
-        num_episodes=anime_detail_dict["num_episodes"],
-        start_season=json.dumps(
-            anime_detail_dict.get(
-                "start_season", {"year": "unknown", "season": "unknown"}
+async def fetch_image(url: Optional[str]) -> Optional[bytes]:
+    if not url:
+        return None
+    try:
+        return await fetch_url(http_client, url, image_cache)
+    except Exception as e:
+        logger.warning(f"获取图片 {url} 失败: {e.__class__.__name__}: {e}")
+        return None
+
+
+async def build_search_result_message(event: Event, animes: List[dict]) -> UniMessage:
+    # 并发获取封面，缩小后拼成一张图片
+    images = await asyncio.gather(
+        *(fetch_image(anime["image_url"]) for anime in animes)
+    )
+    collage = await asyncio.get_running_loop().run_in_executor(
+        None,
+        render_collage,
+        [(anime["id"], image) for anime, image in zip(animes, images)],
+        config.anime_collage_thumb_width,
+        config.anime_collage_quality,
+    )
+
+    msg = At("user", event.get_user_id()) + Text(
+        "找到以下番剧, 使用`搜索番剧 [番剧ID]`来获取详细信息吧：\n"
+    )
+    for anime in animes:
+        msg += Text(f"\nNo. {anime['id']}: {anime['title']}")
+    msg += Image(raw=collage)
+    return msg
+
+
+async def commit_anime_details(
+    anime_detail_dicts: Dict[int, dict],
+) -> Dict[int, AnimeDetailData]:
+    def write(session: SyncSession) -> Dict[int, AnimeDetailData]:
+        anime_details = {
+            anime_detail.id: anime_detail
+            for anime_detail in session.scalars(
+                select(AnimeDetailData).where(
+                    AnimeDetailData.id.in_(anime_detail_dicts)
+                )
             )
-        ),
-        source=anime_detail_dict["source"],
-        average_episode_duration=anime_detail_dict["average_episode_duration"],
-        background=anime_detail_dict["background"],
-        studios=json.dumps(anime_detail_dict["studios"]),
-        statistics=json.dumps(anime_detail_dict["statistics"]),
+        }
+        for anime_id, anime_detail_dict in anime_detail_dicts.items():
+            if (anime_detail := anime_details.get(anime_id)) is not None:
+                apply_anime_detail(anime_detail, anime_detail_dict)
+            else:
+                anime_details[anime_id] = build_anime_detail(anime_detail_dict)
+                session.add(anime_details[anime_id])
+        return anime_details
+
+    anime_details = await users_writer.submit(write)
+
+    for anime_id, anime_detail in anime_details.items():
+        card_cache.invalidate(anime_id)
+        title_index.add(
+            anime_detail.id,
+            anime_detail.title,
+            anime_detail_dicts[anime_id].get("alternative_titles") or {},
+            anime_detail.picture_url,
+        )
+    return anime_details
+
+
+def get_airing_schedule(anime_detail: AnimeDetailData) -> Optional[AiringSchedule]:
+    return AiringSchedule.from_detail(
+        anime_detail.broadcast_day,
+        anime_detail.broadcast_time,
+        anime_detail.start_date,
+        anime_detail.end_date,
+        anime_detail.num_episodes,
+        anime_detail.status,
+    )
+
+
+def check_subscribable(anime_detail: AnimeDetailData, now: datetime) -> Optional[str]:
+    """番剧无法订阅时返回原因
+
+    未开播且开播日期只精确到年或月的番剧可以订阅，详情刷新得到完整日期后排期
+    """
+    if anime_detail.broadcast_day is None:
+        return "番剧放送时间未知，无法订阅"
+    schedule = get_airing_schedule(anime_detail)
+    if schedule is None and anime_detail.status == "not_yet_aired":
+        return None
+    if schedule is None or schedule.next_episode(now) is None:
+        return "番剧已完结，无法订阅"
+    return None
+
+
+def is_stale(anime_detail: AnimeDetailData) -> bool:
+    return (
+        anime_detail.last_update is None
+        or time.time() - anime_detail.last_update > config.anime_detail_ttl
     )
-    session.add(anime_detail)
-    session.commit()
+
+
+async def get_anime_detail(anime_id: int) -> AnimeDetailData:
+    """读取番剧详情，不存在时从 MyAnimeList 获取；已过期时直接返回并在后台刷新
+
+    只在读取本地数据时占用连接，请求上游与等待写入时不持有会话。
+    """
+    async with Session() as session:
+        anime_detail = await session.get(AnimeDetailData, anime_id)
+    if anime_detail is None:
+        anime_detail_dict = await mal_api.get_anime_detail(anime_id)
+        anime_detail = (await commit_anime_details({anime_id: anime_detail_dict}))[
+            anime_id
+        ]
+    elif is_stale(anime_detail):
+        detail_refresher.schedule(anime_id)
     return anime_detail
 
 
-async def fetch_anime():
-    # 读取数据库，如果没有往后三个季度的数据就爬取数据
-    anime_data = anime_summary_session.query(AnimeSummaryData).all()
-
-    if anime_data is not None and len(anime_data) != 0:
-        logger.info("番剧数据存在，正在检查是否需要更新")
-        # 找到季节最新的数据
-        latest_season: Season = json.loads(anime_data[0].season)
-        for data in anime_data:
-            last_season: Season = json.loads(data.season)
-
-            if (
-                last_season["year"] > latest_season["year"]
-                and season_index_map[last_season["season"]]
-                > season_index_map[latest_season["season"]]
-            ):
-                latest_season = last_season
-
-        # 判断最新的季节是否是当前季节后的第三个季节
-        time_info = get_time_info(datetime.now() + timedelta(days=3 * 30))
-        year: int = time_info["year"]
-        season: str = time_info["season"]
-        if (
-            latest_season["year"] >= year
-            and season_index_map[latest_season["season"]] >= season_index_map[season]
-        ):
-            logger.info("番剧数据已为最新")
-            return None
-
-    # 爬取往后三个季度的番剧消息
-    # 获取当前季度
-    time_info = get_time_info(datetime.now())
-    year: int = time_info["year"]
-    season: str = time_info["season"]
-
-    # 使用 gather 并发获取三个季度的番剧信息
-    tasks = []
-    for _ in range(3):
-        tasks.append(mal_api.get_seasonal_anime(year, season))
-        if season == "fall":
-            year += 1
-        season = season_map[(season_index_map[season] + 1) % 4]
-
-    logger.info("正在爬取番剧数据")
-    anime_data_list: List[AnimeData] = [
-        await func for func in tasks
-    ]  # await asyncio.gather(*tasks)
-    # gather 爬取会 timeout
-
-    # 将获取到的番剧信息存入数据库
-    for anime_data in anime_data_list:
-        for data in anime_data["data"]:
-            # 确保ID唯一
-            anime = (
-                anime_summary_session.query(AnimeSummaryData)
-                .filter_by(id=data["node"]["id"])
-                .first()
+async def get_anime_details(
+    anime_ids: List[int],
+) -> Dict[int, Optional[AnimeDetailData]]:
+    """批量读取番剧详情，本地缺失的并发从 MyAnimeList 获取，获取失败的为 None"""
+    anime_details: Dict[int, Optional[AnimeDetailData]] = {}
+    async with Session() as session:
+        stored = (
+            await session.scalars(
+                select(AnimeDetailData).where(AnimeDetailData.id.in_(anime_ids))
+            )
+        ).all()
+    for anime_detail in stored:
+        anime_details[anime_detail.id] = anime_detail
+        if is_stale(anime_detail):
+            detail_refresher.schedule(anime_detail.id)
+
+    missing = [anime_id for anime_id in anime_ids if anime_id not in anime_details]
+    results = await asyncio.gather(
+        *(mal_api.get_anime_detail(anime_id) for anime_id in missing),
+        return_exceptions=True,
+    )
+    anime_detail_dicts: Dict[int, dict] = {}
+    for anime_id, result in zip(missing, results):
+        if isinstance(result, BaseException):
+            logger.error(
+                f"获取番剧 {anime_id} 信息失败: {result.__class__.__name__}: {result}"
+            )
+            anime_details[anime_id] = None
+        else:
+            anime_detail_dicts[anime_id] = result
+    if anime_detail_dicts:
+        anime_details.update(await commit_anime_details(anime_detail_dicts))
+    return anime_details
+
+
+def parse_anime_ids(arg: str) -> Optional[List[int]]:
+    """解析以空格分隔的番剧 ID，去除重复；包含非数字时返回 None"""
+    tokens = arg.split()
+    if not tokens or not all(token.isdigit() for token in tokens):
+        return None
+    return list(dict.fromkeys(int(token) for token in tokens))
+
+
+async def save_refreshed_details(details: Dict[int, AnimeDetail]):
+    def write(session: SyncSession) -> List[int]:
+        anime_details = {
+            anime_detail.id: anime_detail
+            for anime_detail in session.scalars(
+                select(AnimeDetailData).where(AnimeDetailData.id.in_(details))
             )
-            if anime is not None:
+        }
+        moved = []
+        for anime_id, anime_detail_dict in details.items():
+            if (anime_detail := anime_details.get(anime_id)) is None:
+                session.add(build_anime_detail(anime_detail_dict))
                 continue
+            schedule = get_airing_schedule(anime_detail)
+            apply_anime_detail(anime_detail, anime_detail_dict)
+            if schedule != get_airing_schedule(anime_detail):
+                moved.append(anime_id)
+        return moved
+
+    moved = await users_writer.submit(write)
+
+    for anime_id, anime_detail_dict in details.items():
+        card_cache.invalidate(anime_id)
+        title_index.add(
+            anime_id,
+            anime_detail_dict["title"],
+            anime_detail_dict.get("alternative_titles") or {},
+            (anime_detail_dict.get("main_picture") or {}).get("large"),
+        )
+
+    # 放送日历变化的番剧需要重新排期
+    if moved:
+        async with Session() as session:
+            await load_notifications(session, moved)
+
+
+detail_refresher = DetailRefresher(
+    mal_api.get_anime_detail,
+    save_refreshed_details,
+    batch_size=config.anime_refresh_batch_size,
+    interval=config.anime_refresh_interval,
+)
+
 
-            anime = AnimeSummaryData(
-                id=data["node"]["id"],
-                data=json.dumps(data["node"]),
-                pagging=json.dumps(anime_data["paging"]),
-                season=json.dumps(anime_data["season"]),
-                last_update=int(datetime.now().timestamp()),
+async def refresh_unscheduled_details():
+    """刷新已订阅但尚未确定开播日期的番剧详情，确定日期后自动排期"""
+    async with Session() as session:
+        anime_details = await session.scalars(
+            select(AnimeDetailData).where(
+                AnimeDetailData.status == "not_yet_aired",
+                AnimeDetailData.id.in_(select(AnimeGroup.anime_id)),
             )
-            anime_summary_session.add(anime)
-    anime_summary_session.commit()
+        )
+        for anime_detail in anime_details:
+            if get_airing_schedule(anime_detail) is None and is_stale(anime_detail):
+                detail_refresher.schedule(anime_detail.id)
+
+
+async def fetch_season(year: int, season: str) -> IngestStats:
+    stats = IngestStats()
+    row_count = 0
+    async for anime_data in mal_api.iter_seasonal_anime(
+        year, season, limit=config.anime_season_page_size
+    ):
+        stats += await summary_writer.submit(
+            lambda session: upsert_seasonal_page(session, anime_data)
+        )
+        title_index.add_nodes(data["node"] for data in anime_data["data"])
+        row_count += len(anime_data["data"])
 
+    # 所有页面都写入后才记为已爬取
+    await summary_writer.submit(
+        lambda session: record_fetched_season(session, year, season, row_count)
+    )
+    return stats
 
-# 如果数据库为空，爬取番剧数据
-if (
-    anime_summary_session.query(AnimeSummaryData).first() is None
-    or len(anime_summary_session.query(AnimeSummaryData).all()) == 0
+
+async def fetch_anime():
+    # 只爬取往后三个季度中缺失或过期的季度
+    seasons = upcoming_seasons(datetime.now(), 3)
+    async with AnimeSummarySession() as anime_summary_session:
+        missing = await missing_seasons(
+            anime_summary_session, seasons, config.anime_season_ttl
+        )
+    if not missing:
+        logger.info("番剧数据已为最新")
+        return None
+
+    logger.info(
+        "正在爬取番剧数据: "
+        + ", ".join(f"{year} 年{season_cn_map[season]}季" for year, season in missing)
+    )
+    # 请求经过调度器限速与重试，可以安全地并发；每获取一页就写入一页
+    stats = await asyncio.gather(
+        *(fetch_season(year, season) for year, season in missing)
+    )
+    stats = sum(stats, IngestStats())
+    logger.info(
+        f"番剧数据更新完成: 新增 {stats.inserted} 部, 更新 {stats.updated} 部, "
+        f"未变化 {stats.unchanged} 部"
+    )
+
+
+outbox = Outbox(
+    users_writer,
+    send_notification,
+    backoff=config.anime_notice_backoff,
+    backoff_max=config.anime_notice_backoff_max,
+    grace=config.anime_notice_grace,
+    timeout=config.anime_notice_send_timeout,
+)
+notification = Notification([], outbox.enqueue, grace=config.anime_notice_grace)
+
+
+async def load_notifications(
+    session: AsyncSession, anime_ids: Optional[List[int]] = None
 ):
-    get_driver().on_startup(fetch_anime)
+    """将订阅加入通知索引，`anime_ids` 为空时加载全部订阅"""
+    stmt = select(
+        AnimeGroup.anime_id,
+        AnimeGroup.group_id,
+        AnimeGroup.user_id,
+        AnimeDetailData.broadcast_day,
+        AnimeDetailData.broadcast_time,
+        AnimeDetailData.start_date,
+        AnimeDetailData.end_date,
+        AnimeDetailData.num_episodes,
+        AnimeDetailData.status,
+    ).join_from(AnimeGroup, AnimeDetailData)
+    if anime_ids is not None:
+        stmt = stmt.where(AnimeGroup.anime_id.in_(anime_ids))
+
+    schedules: Dict[int, Optional[AiringSchedule]] = {}
+    for anime_id, group_id, user_id, *columns in await session.execute(stmt):
+        if anime_id not in schedules:
+            schedules[anime_id] = AiringSchedule.from_detail(*columns)
+        await notification.add_notification(
+            {
+                "anime_id": anime_id,
+                "group_id": group_id,
+                "user_id": user_id,
+                "schedule": schedules[anime_id],
+            }
+        )
+
+
+# 通知索引加载完成前，订阅的增删需要等待，避免与批量加载交错
+# 在 init_database 中创建，兼容 Python 3.8/3.9 的 loop 绑定
+notification_ready: Optional[asyncio.Event] = None
+warm_up_task: Optional[asyncio.Task] = None
+
+
+async def wait_notification_ready():
+    if notification_ready is not None:
+        await notification_ready.wait()
+
+
+async def warm_up():
+    assert notification_ready is not None
+    start = time.perf_counter()
+
+    try:
+        # 一次查询加载全部订阅与已知的群路由
+        async with Session() as session:
+            await load_notifications(session)
+            for group_id, bot_id in await session.execute(
+                select(GroupRoute.group_id, GroupRoute.bot_id)
+            ):
+                delivery.add_route(group_id, bot_id)
+    except Exception as e:
+        logger.error(
+            f"加载订阅失败，未加载的订阅在重启前不会推送: {e.__class__.__name__}: {e}"
+        )
+    try:
+        # 补发重启期间错过的放送，发件箱中未发出的通知也会继续发送
+        await notification.update_notification(catch_up=config.anime_notice_grace)
+    except Exception as e:
+        logger.error(f"注册番剧通知任务失败: {e.__class__.__name__}: {e}")
+    finally:
+        # 加载失败时也不能让订阅命令一直等待
+        outbox.start()
+        notification_ready.set()
+    logger.info(
+        f"已加载 {len(notification)} 条订阅，用时 {time.perf_counter() - start:.2f}s"
+    )
+
+    # 建立本地标题搜索索引，番剧详情中的别名更完整，后加载以覆盖
+    async with AnimeSummarySession() as anime_summary_session:
+        load_summary_rows(
+            title_index,
+            await anime_summary_session.execute(select(AnimeSummaryData.data)),
+        )
+    async with Session() as session:
+        load_detail_rows(
+            title_index,
+            await session.execute(
+                select(
+                    AnimeDetailData.id,
+                    AnimeDetailData.title,
+                    AnimeDetailData.alternative_titles,
+                    AnimeDetailData.picture_url,
+                )
+            ),
+        )
+
+    # 缺少往后三个季度的番剧数据时爬取
+    try:
+        await fetch_anime()
+    except Exception as e:
+        logger.error(f"爬取番剧数据失败: {e.__class__.__name__}: {e}")
+
+    logger.info(f"番剧通知插件预热完成，用时 {time.perf_counter() - start:.2f}s")
+
+
+async def init_database():
+    # 启动时只建表与迁移，其余预热在后台进行，不阻塞机器人连接
+    start = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_users_db)
+    async with anime_summary_engine.begin() as conn:
+        await conn.run_sync(AnimeSummaryBase.metadata.create_all)
+        await conn.run_sync(upgrade_summary_db)
+    logger.info(
+        f"番剧通知插件数据库初始化完成，用时 {time.perf_counter() - start:.2f}s"
+    )
+
+    global notification_ready, warm_up_task
+    notification_ready = asyncio.Event()
+    warm_up_task = asyncio.create_task(warm_up())
+
+
+metrics_runner: Optional[Any] = None
+
+
+async def start_metrics():
+    global metrics_runner
+    if config.anime_metrics_port is not None:
+        metrics_runner = await start_metrics_server(
+            config.anime_metrics_host, config.anime_metrics_port
+        )
+        logger.info(
+            f"番剧通知插件指标已在 http://{config.anime_metrics_host}:"
+            f"{config.anime_metrics_port}/metrics 提供"
+        )
+    if config.anime_metrics_file is not None:
+        scheduler.add_job(
+            dump_metrics,
+            "interval",
+            args=(config.anime_metrics_file,),
+            seconds=config.anime_metrics_interval,
+        )
+
+
+async def stop_metrics():
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+    if config.anime_metrics_file is not None:
+        await dump_metrics(config.anime_metrics_file)
+
+
+get_driver().on_startup(start_metrics)
+get_driver().on_shutdown(stop_metrics)
+
+
+async def close_database():
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+        try:
+            await warm_up_task
+        except asyncio.CancelledError:
+            pass
+    await detail_refresher.stop()
+    await outbox.stop()
+    await delivery.stop()
+    await users_writer.stop()
+    await summary_writer.stop()
+    users_write_engine.dispose()
+    summary_write_engine.dispose()
+    await engine.dispose()
+    await anime_summary_engine.dispose()
+
+
+get_driver().on_startup(init_database)
+get_driver().on_shutdown(close_database)
 
 # 每天 0 点更新番剧数据
 scheduler.add_job(fetch_anime, "cron", hour=0, minute=0, second=0)
-
-notification = Notification(
-    [
-        {
-            "func": build_notice_func(anime_group),
-            "day": (broadcast := json.loads(anime_group.anime.broadcast))[
-                "day_of_the_week"
-            ],
-            "hour": int(broadcast["start_time"].split(":")[0]),
-            "minute": int(broadcast["start_time"].split(":")[1]),
-            "anime_id": anime_group.anime_id,
-            "group_id": anime_group.group_id,
-            "user_id": anime_group.user_id,
-        }
-        for anime_group in session.query(AnimeGroup).all()
-    ]
-)
-get_driver().on_startup(notification.update_notification)
+# 每小时检查尚未确定开播日期的订阅，详情过期时刷新
+scheduler.add_job(refresh_unscheduled_details, "cron", minute=30, second=0)
 
 search_anime = on_command("搜索番剧", aliases={"番剧搜索"})
 subscribe = on_command("订阅番剧", aliases={"番剧订阅"}, rule=is_group)
 unsubscribe = on_command("取消订阅番剧", aliases={"番剧取消订阅"}, rule=is_group)
 my_subscriptions = on_command("我的订阅", aliases={"订阅列表"}, rule=is_group)
+show_metrics = on_command("番剧统计", permission=SUPERUSER)
 
 
 @search_anime.handle()
@@ -317,26 +730,15 @@ async def handle_search(bot: Bot, event: Event, arg: Message = CommandArg()):
         if len(animes) == 0:
             await search_anime.finish("没有找到相关番剧，换换关键词试试吧")
         else:
-            msg = At("user", event.get_user_id()) + Text(
-                "找到以下番剧, 使用`搜索番剧 [番剧ID]`来获取详细信息吧：\n"
-            )
-            for anime in animes:
-                msg += Text(f"\nNo. {anime['id']}: {anime['title']}\n")
-                msg += Image(raw=anime["image"])
-            await search_anime.finish(await UniMessage(msg).export(bot))
+            msg = await build_search_result_message(event, animes)
+            await search_anime.finish(await msg.export(bot))
     else:
         anime_id = int(str_arg)
-        anime_detail = session.query(AnimeDetailData).filter_by(id=anime_id).first()
-        if anime_detail is None:
-            # 写入新番剧数据
-            try:
-                anime_detail_dict = await mal_api.get_anime_detail(anime_id)
-                anime_detail = await commit_anime_detail_data(
-                    anime_id, anime_detail_dict
-                )
-            except Exception as e:
-                logger.error(f"获取番剧信息失败: {e.__class__.__name__}: {e}")
-                await search_anime.finish("获取番剧信息失败，请检查番剧ID是否正确")
+        try:
+            anime_detail = await get_anime_detail(anime_id)
+        except Exception as e:
+            logger.error(f"获取番剧信息失败: {e.__class__.__name__}: {e}")
+            await search_anime.finish("获取番剧信息失败，请检查番剧ID是否正确")
 
         await (await build_anime_info_message(anime_detail)).send(
             UniMessage.get_target(event, bot), bot, at_sender=event.get_user_id()
@@ -346,138 +748,199 @@ async def handle_search(bot: Bot, event: Event, arg: Message = CommandArg()):
 @subscribe.handle()
 async def handle_subscribe(bot: Bot, event: Event, arg: Message = CommandArg()):
     if (str_arg := arg.extract_plain_text().strip()) == "":
-        await subscribe.finish("格式错误，请输入`订阅番剧 [番剧名称/番剧ID]`")
-    elif not str_arg.isdigit():
+        await subscribe.finish("格式错误，请输入`订阅番剧 [番剧名称/番剧ID ...]`")
+    elif (anime_ids := parse_anime_ids(str_arg)) is None:
         animes = await get_animes_by_title(str_arg)
 
         # 生成消息
         if len(animes) == 0:
             await subscribe.finish("没有找到相关番剧，换换关键词试试吧")
         else:
-            msg = At("user", event.get_user_id()) + Text(
-                "找到以下番剧, 使用`搜索番剧 [番剧ID]`来获取详细信息吧：\n"
-            )
-            for anime in animes:
-                msg += Text(f"\nNo. {anime['id']}: {anime['title']}\n")
-                msg += Image(raw=anime["image"])
-            await subscribe.finish(await UniMessage(msg).export(bot))
+            msg = await build_search_result_message(event, animes)
+            await subscribe.finish(await msg.export(bot))
     else:
-        anime_id = int(str_arg)
-        anime_detail = session.query(AnimeDetailData).filter_by(id=anime_id).first()
-        if anime_detail is None:
-            # 写入新番剧数据
-            try:
-                anime_detail_dict = await mal_api.get_anime_detail(anime_id)
-                anime_detail = await commit_anime_detail_data(
-                    anime_id, anime_detail_dict
-                )
-            except Exception as e:
-                logger.error(f"获取番剧信息失败: {e.__class__.__name__}: {e}")
-                await subscribe.finish("获取番剧信息失败，请检查番剧ID是否正确")
+        anime_details = await get_anime_details(anime_ids)
 
-        if json.loads(anime_detail.broadcast)["day_of_the_week"] == "unknown":
-            await subscribe.finish("番剧放送时间未知，无法订阅")
+        now = datetime.now()
+        schedules: Dict[int, Optional[AiringSchedule]] = {}
+        failures: Dict[int, str] = {}
+        for anime_id in anime_ids:
+            if (anime_detail := anime_details[anime_id]) is None:
+                failures[anime_id] = "获取番剧信息失败，请检查番剧ID是否正确"
+            elif (reason := check_subscribable(anime_detail, now)) is not None:
+                failures[anime_id] = reason
+            else:
+                # 尚未确定开播日期时为 None，只加入索引，刷新详情后排期
+                schedules[anime_id] = get_airing_schedule(anime_detail)
 
         target = UniMessage.get_target(event, bot)
-        user = session.query(User).filter_by(user_id=event.get_user_id()).first()
-
-        if user is None:
-            user = User(user_id=event.get_user_id())
-            session.add(user)
-            session.commit()
-
-        anime_group = AnimeGroup(
-            user_id=user.user_id,
-            anime_id=anime_detail.id,
-            group_id=target.id or target.parent_id,
-        )
-        session.add(anime_group)
-        session.commit()
+        user_id = event.get_user_id()
+        group_id = target.id or target.parent_id
+        subscribed: List[int] = []
+        if schedules:
+            await wait_notification_ready()
+
+            # 所有订阅在同一个事务中写入
+            def write(session: SyncSession) -> List[int]:
+                existing = set(
+                    session.scalars(
+                        select(AnimeGroup.anime_id).filter(
+                            AnimeGroup.user_id == user_id,
+                            AnimeGroup.group_id == group_id,
+                            AnimeGroup.anime_id.in_(schedules),
+                        )
+                    )
+                )
+                new = [anime_id for anime_id in schedules if anime_id not in existing]
+                if new:
+                    # 并发的相同订阅由唯一索引去重
+                    session.execute(
+                        insert(User).values(user_id=user_id).on_conflict_do_nothing()
+                    )
+                    session.execute(
+                        insert(AnimeGroup).on_conflict_do_nothing(),
+                        [
+                            {
+                                "user_id": user_id,
+                                "anime_id": anime_id,
+                                "group_id": group_id,
+                            }
+                            for anime_id in new
+                        ],
+                    )
+                return new
+
+            subscribed = await users_writer.submit(write)
+            for anime_id in schedules:
+                if anime_id not in subscribed:
+                    failures[anime_id] = "你已经订阅过这部番剧了"
+
+            # 添加定时任务
+            await notification.add_notifications(
+                [
+                    {
+                        "anime_id": anime_id,
+                        "group_id": group_id,
+                        "user_id": user_id,
+                        "schedule": schedules[anime_id],
+                    }
+                    for anime_id in subscribed
+                ]
+            )
 
-        # 添加定时任务
-        notice_func = build_notice_func(anime_group)
-        await notification.add_notification(
-            {
-                "func": notice_func,
-                "day": (broadcast := json.loads(anime_detail.broadcast))[
-                    "day_of_the_week"
-                ],
-                "hour": int(broadcast["start_time"].split(":")[0]),
-                "minute": int(broadcast["start_time"].split(":")[1]),
-                "anime_id": anime_group.anime_id,
-                "group_id": anime_group.group_id,
-                "user_id": anime_group.user_id,
-            }
-        )
-        await ("订阅成功！\n" + (await build_anime_info_message(anime_detail))).send(
-            target, bot, at_sender=event.get_user_id()
-        )
+        if len(anime_ids) == 1:
+            if subscribed:
+                msg = "订阅成功！\n" + (
+                    await build_anime_info_message(anime_details[anime_ids[0]])
+                )
+                await msg.send(target, bot, at_sender=user_id)
+            else:
+                await subscribe.finish(failures[anime_ids[0]])
+        else:
+            text = ""
+            if subscribed:
+                text += f"成功订阅 {len(subscribed)} 部番剧：\n"
+                for anime_id in subscribed:
+                    text += f"No. {anime_id}: {anime_details[anime_id].display_title}\n"
+            if failures:
+                text += "以下番剧订阅失败：\n"
+                for anime_id in anime_ids:
+                    if anime_id in failures:
+                        text += f"No. {anime_id}: {failures[anime_id]}\n"
+            await UniMessage(text.rstrip()).send(target, bot, at_sender=user_id)
 
 
 @unsubscribe.handle()
 async def handle_unsubscribe(bot: Bot, event: Event, arg: Message = CommandArg()):
-    if (str_arg := arg.extract_plain_text().strip()) == "" or not str_arg.isdigit():
-        await unsubscribe.finish("格式错误，请输入`取消订阅番剧 [番剧ID]`")
-    else:
-        anime_id = int(str_arg)
-        anime_detail = session.query(AnimeDetailData).filter_by(id=anime_id).first()
-        if anime_detail is None:
-            # 写入新番剧数据
-            try:
-                anime_detail_dict = await mal_api.get_anime_detail(anime_id)
-                anime_detail = await commit_anime_detail_data(
-                    anime_id, anime_detail_dict
+    if (anime_ids := parse_anime_ids(arg.extract_plain_text())) is None:
+        await unsubscribe.finish("格式错误，请输入`取消订阅番剧 [番剧ID ...]`")
+
+    # 已订阅的番剧详情一定在本地，无需请求 MyAnimeList
+    target = UniMessage.get_target(event, bot)
+    user_id = event.get_user_id()
+    group_id = target.id or target.parent_id
+    conditions = (
+        AnimeGroup.user_id == user_id,
+        AnimeGroup.group_id == group_id,
+        AnimeGroup.anime_id.in_(anime_ids),
+    )
+    await wait_notification_ready()
+
+    def write(session: SyncSession) -> Dict[int, Optional[str]]:
+        titles = dict(
+            (
+                session.execute(
+                    select(AnimeGroup.anime_id, AnimeDetailData.display_title)
+                    .outerjoin(AnimeDetailData)
+                    .where(*conditions)
                 )
-            except Exception as e:
-                logger.error(f"获取番剧信息失败: {e.__class__.__name__}: {e}")
-                await unsubscribe.finish("获取番剧信息失败，请检查番剧ID是否正确")
-
-        target = UniMessage.get_target(event, bot)
-        anime_group = (
-            session.query(AnimeGroup)
-            .filter_by(user_id=event.get_user_id(), anime_id=anime_detail.id)
-            .first()
+            ).all()
         )
-        if anime_group is None:
-            await unsubscribe.finish("你还没有订阅这部番剧")
-        session.delete(anime_group)
-        session.commit()
+        if titles:
+            session.execute(delete(AnimeGroup).where(*conditions))
+        return titles
 
-        # 删除定时任务
-        await notification.remove_notification(
-            {
-                "anime_id": anime_group.anime_id,
-                "group_id": anime_group.group_id,
-                "user_id": anime_group.user_id,
-            }
-        )
-        await UniMessage("取消订阅成功！\n").send(
-            target, bot, at_sender=event.get_user_id()
-        )
+    titles = await users_writer.submit(write)
+
+    # 删除定时任务
+    await notification.remove_notifications(
+        [(anime_id, group_id, user_id) for anime_id in titles]
+    )
+
+    if len(anime_ids) == 1:
+        if not titles:
+            await unsubscribe.finish("你还没有订阅这部番剧")
+        await UniMessage("取消订阅成功！\n").send(target, bot, at_sender=user_id)
+    else:
+        text = ""
+        if titles:
+            text += f"成功取消订阅 {len(titles)} 部番剧：\n"
+        missing: List[int] = []
+        for anime_id in anime_ids:
+            if anime_id in titles:
+                text += f"No. {anime_id}: {titles[anime_id] or ''}\n"
+            else:
+                missing.append(anime_id)
+        if missing:
+            text += "以下番剧还没有订阅：\n"
+            text += "".join(f"No. {anime_id}\n" for anime_id in missing)
+        await UniMessage(text.rstrip()).send(target, bot, at_sender=user_id)
 
 
 @my_subscriptions.handle()
 async def handle_my_subscriptions(bot: Bot, event: Event):
-    anime_groups = (
-        session.query(AnimeGroup)
-        .filter_by(user_id=event.get_user_id())
-        .join(AnimeDetailData)
-        .all()
-    )
-    if len(anime_groups) == 0:
+    # 只列出当前群的订阅，与取消订阅的范围一致
+    target = UniMessage.get_target(event, bot)
+    async with Session() as session:
+        anime_details = (
+            await session.execute(
+                select(
+                    AnimeDetailData.id,
+                    AnimeDetailData.display_title,
+                    AnimeDetailData.broadcast_day,
+                    AnimeDetailData.broadcast_time,
+                )
+                .join_from(AnimeGroup, AnimeDetailData)
+                .where(
+                    AnimeGroup.user_id == event.get_user_id(),
+                    AnimeGroup.group_id == (target.id or target.parent_id),
+                )
+                .order_by(AnimeGroup.id)
+            )
+        ).all()
+
+    if len(anime_details) == 0:
         await my_subscriptions.finish("你还没有订阅任何番剧")
     else:
         msg = At("user", event.get_user_id()) + Text("你订阅的番剧有：\n")
-        for anime_group in anime_groups:
-            anime_detail = (
-                session.query(AnimeDetailData)
-                .filter_by(id=anime_group.anime_id)
-                .first()
-            )
-            alternative_titles = json.loads(anime_detail.alternative_titles)
-            broadcast = json.loads(anime_detail.broadcast)
+        for anime_detail in anime_details:
             msg += Text(
-                f"\nNo. {anime_detail.id}: {alternative_titles.get('ja') or alternative_titles.get('en') or alternative_titles['synonyms'][0]}\n"
-                + f"放送时间: 每{day_of_the_week_map[broadcast['day_of_the_week']]} {broadcast['start_time']}\n"
+                f"\nNo. {anime_detail.id}: {anime_detail.display_title}\n"
+                + f"放送时间: 每{day_of_the_week_map[anime_detail.broadcast_day]} {anime_detail.broadcast_time}\n"
             )
         await my_subscriptions.finish(await UniMessage(msg).export(bot))
+
+
+@show_metrics.handle()
+async def handle_metrics():
+    await show_metrics.finish(registry.summary() or "暂无统计数据")
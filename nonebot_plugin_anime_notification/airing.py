@@ -0,0 +1,114 @@
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+
+from .maps import day_of_the_week_num_map
+
+WEEK = timedelta(weeks=1)
+
+
+class Episode(NamedTuple):
+    number: Optional[int]
+    """集数，开播日期未知时为 None"""
+    air_time: datetime
+
+
+def parse_date(value: Optional[str]) -> Optional[date]:
+    # MyAnimeList 的日期可能只精确到年或月，这类日期无法推算放送日
+    try:
+        return datetime.strptime(value or "", "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def next_weekday(day: date, weekday: int) -> date:
+    return day + timedelta(days=(weekday - day.weekday()) % 7)
+
+
+class AiringSchedule:
+    """根据开播日期、放送时间与集数推算的每周放送日历
+
+    第 1 集为开播日期当天或之后的第一个放送日，此后每周一集；
+    超过集数或完结日期后不再有放送。已开播但开播日期未知时只按周推算，不标注集数。
+    """
+
+    __slots__ = ("first", "last", "num_episodes", "weekday", "time")
+
+    def __init__(
+        self,
+        weekday: int,
+        hour: int,
+        minute: int,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        num_episodes: Optional[int] = None,
+    ) -> None:
+        self.weekday = weekday
+        self.time = (hour, minute)
+        self.num_episodes = num_episodes or None
+        self.first = (
+            self._at(next_weekday(start_date, weekday))
+            if start_date is not None
+            else None
+        )
+        # 完结日期当天的放送仍然有效
+        self.last = self._at(end_date) if end_date is not None else None
+
+    @classmethod
+    def from_detail(
+        cls,
+        broadcast_day: Optional[str],
+        broadcast_time: Optional[str],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        num_episodes: Optional[int] = None,
+        status: Optional[str] = None,
+    ) -> Optional["AiringSchedule"]:
+        """由番剧详情的列构造，放送时间未知、已完结或尚未确定开播日期时返回 None"""
+        if broadcast_day not in day_of_the_week_num_map or not broadcast_time:
+            return None
+
+        end = parse_date(end_date)
+        if status == "finished_airing" and end is None:
+            return None
+        start = parse_date(start_date)
+        # 未开播且开播日期只精确到年或月时无法确定第 1 集，等详情刷新后再排期
+        if status == "not_yet_aired" and start is None:
+            return None
+
+        hour, minute = broadcast_time.split(":")
+        return cls(
+            day_of_the_week_num_map[broadcast_day],
+            int(hour),
+            int(minute),
+            start,
+            end,
+            num_episodes,
+        )
+
+    def _at(self, day: date) -> datetime:
+        return datetime(day.year, day.month, day.day, *self.time)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AiringSchedule) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__
+        )
+
+    def next_episode(self, after: datetime) -> Optional[Episode]:
+        """`after` 之后的下一次放送，已完结时返回 None"""
+        if self.first is None:
+            air_time = self._at(next_weekday(after.date(), self.weekday))
+            if air_time <= after:
+                air_time += WEEK
+            number = None
+        elif self.first > after:
+            air_time, number = self.first, 1
+        else:
+            weeks = (after - self.first) // WEEK + 1
+            air_time, number = self.first + weeks * WEEK, weeks + 1
+
+        if number is not None and self.num_episodes is not None:
+            if number > self.num_episodes:
+                return None
+        if self.last is not None and air_time.date() > self.last.date():
+            return None
+        return Episode(number, air_time)
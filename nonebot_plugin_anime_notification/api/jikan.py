@@ -1,15 +1,21 @@
-import aiohttp
+from ..response_cache import ResponseCache
 
 
 class Jikan:
-    def __init__(self) -> None:
+    def __init__(self, http: ResponseCache, search_ttl: float = 0) -> None:
+        self._http = http
+        self._search_ttl = search_ttl
         self._base_url = "https://api.jikan.moe/v4"
 
     async def get_anime_search(self, q: str, sfw: bool = True, limit: int = 10):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{self._base_url}/anime?q={q}&limit={limit}&sfw={str(sfw).lower()}",
-            ) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to search anime: {await response.text()}")
-                return await response.json()
+        # 大小写与空白不同的相同关键词共用缓存
+        q = " ".join(q.split()).lower()
+        response = await self._http.get(
+            f"{self._base_url}/anime",
+            params={"q": q, "limit": limit, "sfw": str(sfw).lower()},
+            upstream="jikan",
+            ttl=self._search_ttl,
+        )
+        if response.status != 200:
+            raise Exception(f"Failed to search anime: {response.text()}")
+        return response.json()
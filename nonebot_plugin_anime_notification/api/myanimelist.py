@@ -1,10 +1,13 @@
-import aiohttp
+from typing import AsyncIterator
 
+from ..response_cache import ResponseCache
 from ..models.myanimelist import AnimeData, AnimeDetail
 
 
 class MyAnimeList:
-    def __init__(self, client_id: str):
+    def __init__(self, client_id: str, http: ResponseCache, detail_ttl: float = 0):
+        self._http = http
+        self._detail_ttl = detail_ttl
         self._headers = {"X-MAL-CLIENT-ID": client_id}
         self._base_url = "https://api.myanimelist.net/v2"
         self._fields = [
@@ -27,27 +30,42 @@ class MyAnimeList:
             "studios",
             "statistics",
         ]
+        # 季度番剧列表只请求写入摘要与建立搜索索引需要的字段
+        self._seasonal_fields = [
+            "alternative_titles",
+            "start_date",
+            "end_date",
+            "media_type",
+            "status",
+            "num_episodes",
+            "start_season",
+            "broadcast",
+        ]
 
-    async def get_seasonal_anime(self, year: int, season: str) -> AnimeData:
-        async with aiohttp.ClientSession(headers=self._headers) as session:
-            async with session.get(
-                f"{self._base_url}/anime/season/{year}/{season}?limit=500",
-            ) as response:
-                if response.status != 200:
-                    raise Exception(
-                        f"Failed to get seasonal anime: {await response.text()}"
-                    )
-                result = await response.json()
-        return result
+    async def iter_seasonal_anime(
+        self, year: int, season: str, limit: int = 100
+    ) -> AsyncIterator[AnimeData]:
+        """按 paging.next 逐页获取季度番剧，每获取一页就产出一页"""
+        url = (
+            f"{self._base_url}/anime/season/{year}/{season}?limit={limit}&fields="
+            + ",".join(self._seasonal_fields)
+        )
+        while url:
+            # 季度列表不缓存，只合并同时进行的相同请求
+            response = await self._http.get(url, headers=self._headers, upstream="mal")
+            if response.status != 200:
+                raise Exception(f"Failed to get seasonal anime: {response.text()}")
+            page: AnimeData = response.json()
+            yield page
+            url = page.get("paging", {}).get("next")
 
     async def get_anime_detail(self, anime_id: int) -> AnimeDetail:
-        async with aiohttp.ClientSession(headers=self._headers) as session:
-            async with session.get(
-                f"{self._base_url}/anime/{anime_id}?fields=" + ",".join(self._fields),
-            ) as response:
-                if response.status != 200:
-                    raise Exception(
-                        f"Failed to get anime detail: {await response.text()}"
-                    )
-                result = await response.json()
-        return result
+        response = await self._http.get(
+            f"{self._base_url}/anime/{anime_id}?fields=" + ",".join(self._fields),
+            headers=self._headers,
+            upstream="mal",
+            ttl=self._detail_ttl,
+        )
+        if response.status != 200:
+            raise Exception(f"Failed to get anime detail: {response.text()}")
+        return response.json()
@@ -0,0 +1,113 @@
+import json
+import aiohttp
+from multidict import CIMultiDict
+from typing import Any, Dict, Mapping, Optional
+
+from .config import Config
+from .metrics import HTTP_LATENCY, HTTP_REQUESTS
+from .throttle import RequestScheduler, TokenBucket
+
+
+class Response:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: Mapping[str, str], body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class HttpClient:
+    """插件共用的 HTTP 客户端，复用连接池与 keep-alive 连接"""
+
+    def __init__(self, config: Config) -> None:
+        self._limit = config.anime_http_limit
+        self._limit_per_host = config.anime_http_limit_per_host
+        self._keepalive_timeout = config.anime_http_keepalive_timeout
+        self._timeout = aiohttp.ClientTimeout(
+            total=config.anime_http_timeout,
+            connect=config.anime_http_connect_timeout,
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.scheduler = RequestScheduler(
+            {
+                "mal": TokenBucket(config.anime_mal_rate_limit, config.anime_mal_burst),
+                "jikan": TokenBucket(
+                    config.anime_jikan_rate_limit, config.anime_jikan_burst
+                ),
+            },
+            concurrency=config.anime_request_concurrency,
+            retries=config.anime_request_retries,
+            backoff=config.anime_request_backoff,
+            backoff_max=config.anime_request_backoff_max,
+            timeout=config.anime_request_deadline,
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        # 启动前调用时也能懒加载，保证必须在事件循环中
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._limit,
+                limit_per_host=self._limit_per_host,
+                keepalive_timeout=self._keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self._timeout
+            )
+        return self._session
+
+    async def startup(self) -> None:
+        self.session
+
+    async def shutdown(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+    ) -> Response:
+        async with self.session.get(url, params=params, headers=headers) as response:
+            return Response(
+                response.status, CIMultiDict(response.headers), await response.read()
+            )
+
+    async def get(
+        self,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        upstream: Optional[str] = None,
+        deadline: Optional[float] = None,
+    ) -> Response:
+        """发起 GET 请求
+
+        指定 `upstream` 时请求经过调度器，受该上游的限速、并发上限与重试策略约束；
+        `deadline` 为 `loop.time()` 下的截止时间，超过后请求会被取消。
+        """
+        label = upstream or "direct"
+        with HTTP_LATENCY.time(upstream=label):
+            try:
+                if upstream is None:
+                    response = await self._get(url, params, headers)
+                else:
+                    response = await self.scheduler.run(
+                        upstream, lambda: self._get(url, params, headers), deadline
+                    )
+            except Exception:
+                HTTP_REQUESTS.inc(upstream=label, status="error")
+                raise
+        HTTP_REQUESTS.inc(upstream=label, status=str(response.status))
+        return response
@@ -0,0 +1,68 @@
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
+
+# MyAnimeList 封面的宽高比约为 225:320
+THUMB_RATIO = 320 / 225
+LABEL_HEIGHT = 32
+GAP = 8
+BACKGROUND = (255, 255, 255)
+PLACEHOLDER = (221, 221, 221)
+LABEL_COLOR = (34, 34, 34)
+
+
+def _thumbnail(image: Optional[bytes], size: Tuple[int, int]) -> Image.Image:
+    if image is not None:
+        try:
+            with Image.open(BytesIO(image)) as source:
+                source.draft("RGB", size)
+                thumb = source.convert("RGB")
+        except (UnidentifiedImageError, OSError):
+            pass
+        else:
+            # 等比缩放后居中裁剪到格子大小
+            scale = max(size[0] / thumb.width, size[1] / thumb.height)
+            thumb = thumb.resize(
+                (round(thumb.width * scale), round(thumb.height * scale)),
+                Image.Resampling.LANCZOS,
+            )
+            left = (thumb.width - size[0]) // 2
+            top = (thumb.height - size[1]) // 2
+            return thumb.crop((left, top, left + size[0], top + size[1]))
+    return Image.new("RGB", size, PLACEHOLDER)
+
+
+def render_collage(
+    items: List[Tuple[int, Optional[bytes]]], thumb_width: int, quality: int
+) -> bytes:
+    """将搜索结果的封面缩小后横向拼成一张 JPEG，每张封面下方标注番剧 ID
+
+    无法解码的封面用灰色占位。该函数会阻塞，应在线程池中执行。
+    """
+    size = (thumb_width, round(thumb_width * THUMB_RATIO))
+    collage = Image.new(
+        "RGB",
+        (
+            len(items) * (size[0] + GAP) + GAP,
+            size[1] + LABEL_HEIGHT + GAP * 2,
+        ),
+        BACKGROUND,
+    )
+    draw = ImageDraw.Draw(collage)
+    font = ImageFont.load_default(size=LABEL_HEIGHT * 2 // 3)
+
+    for i, (anime_id, image) in enumerate(items):
+        left = GAP + i * (size[0] + GAP)
+        collage.paste(_thumbnail(image, size), (left, GAP))
+        draw.text(
+            (left + size[0] / 2, GAP + size[1] + LABEL_HEIGHT / 2),
+            f"No. {anime_id}",
+            fill=LABEL_COLOR,
+            font=font,
+            anchor="mm",
+        )
+
+    output = BytesIO()
+    collage.save(output, "JPEG", quality=quality, optimize=True)
+    return output.getvalue()
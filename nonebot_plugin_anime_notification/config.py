@@ -1,6 +1,110 @@
+from pathlib import Path
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class Config(BaseModel):
     mal_client_id: str
     """MyAnimeList API client id"""
+
+    anime_http_timeout: float = 30
+    """单次 HTTP 请求的总超时时间（秒）"""
+    anime_http_connect_timeout: float = 10
+    """建立连接的超时时间（秒）"""
+    anime_http_limit: int = 100
+    """连接池的最大连接数"""
+    anime_http_limit_per_host: int = 10
+    """连接池对单个主机的最大连接数"""
+    anime_http_keepalive_timeout: float = 30
+    """空闲 keep-alive 连接的保留时间（秒）"""
+
+    anime_image_cache_size: int = 256
+    """图片磁盘缓存的容量上限（MB）"""
+    anime_image_memory_cache_size: int = 32
+    """图片内存缓存的容量上限（MB）"""
+    anime_image_cache_ttl: int = 7 * 24 * 60 * 60
+    """图片缓存多久后需要向源站重新验证（秒）"""
+
+    anime_mal_rate_limit: float = 3
+    """MyAnimeList API 每秒允许的请求数"""
+    anime_mal_burst: int = 6
+    """MyAnimeList API 允许的突发请求数"""
+    anime_jikan_rate_limit: float = 1
+    """Jikan API 每秒允许的请求数"""
+    anime_jikan_burst: int = 3
+    """Jikan API 允许的突发请求数"""
+    anime_request_concurrency: int = 8
+    """同时进行的 API 请求数上限"""
+    anime_request_retries: int = 3
+    """API 请求遇到 429/5xx 或网络错误时的最大重试次数"""
+    anime_request_backoff: float = 1
+    """重试退避的初始时间（秒），每次重试翻倍并加入随机抖动"""
+    anime_request_backoff_max: float = 30
+    """单次重试退避的最长时间（秒）"""
+    anime_request_deadline: float = 120
+    """API 请求（含排队与重试）的默认截止时间（秒）"""
+    anime_http_cache_size: int = 256
+    """API 响应内存缓存的最大条目数"""
+    anime_mal_detail_cache_ttl: float = 5 * 60
+    """MyAnimeList 番剧详情响应的缓存时间（秒）"""
+    anime_jikan_search_cache_ttl: float = 10 * 60
+    """Jikan 搜索结果的缓存时间（秒）"""
+
+    anime_db_pool_size: int = 20
+    """每个数据库连接池保持的连接数"""
+    anime_db_max_overflow: int = 30
+    """连接池已满时允许额外创建的连接数"""
+    anime_db_write_interval: float = 0.01
+    """写操作排队后等待合并的时间（秒），期间的写操作在同一个事务中提交"""
+    anime_db_write_batch: int = 500
+    """单个写事务最多合并的写操作数"""
+
+    anime_season_ttl: int = 20 * 60 * 60
+    """季度番剧数据距上次爬取多久后需要重新爬取（秒）"""
+
+    anime_search_threshold: float = 85
+    """本地标题搜索的最低匹配分数（0-100，按整个标题比较），低于该分数时改用 Jikan 搜索"""
+
+    anime_detail_ttl: int = 24 * 60 * 60
+    """番剧详情多久后过期，过期后在读取时于后台刷新（秒）"""
+    anime_refresh_batch_size: int = 5
+    """后台刷新番剧详情时每批的数量"""
+    anime_refresh_interval: float = 10
+    """后台刷新番剧详情时批次之间的间隔（秒）"""
+
+    anime_card_cache_size: int = 256
+    """缓存渲染好的番剧信息卡片的数量"""
+
+    anime_season_page_size: int = 100
+    """爬取季度番剧时每页的数量"""
+
+    anime_send_rate_limit: float = 1
+    """每个机器人账号每秒发送的通知消息数"""
+    anime_send_burst: int = 5
+    """每个机器人账号允许的突发发送数"""
+    anime_send_concurrency: int = 1
+    """每个机器人账号同时发送的消息数"""
+
+    anime_notice_grace: int = 30 * 60
+    """放送后多久内仍会发送（含重启后补发）未送达的通知（秒）"""
+    anime_notice_backoff: float = 10
+    """通知重试退避的初始时间（秒），每次重试翻倍"""
+    anime_notice_backoff_max: float = 60
+    """单次通知重试退避的最长时间（秒），发送失败的通知会一直重试到 anime_notice_grace"""
+    anime_notice_send_timeout: float = 60
+    """单条通知的发送超时（秒），超时视为发送失败并重试"""
+
+    anime_collage_thumb_width: int = 150
+    """搜索结果拼图中每张封面的宽度（像素）"""
+    anime_collage_quality: int = 80
+    """搜索结果拼图的 JPEG 质量（1-95）"""
+
+    anime_metrics_file: Optional[Path] = None
+    """定期将指标以 Prometheus 文本格式写入的文件，为空时不写入"""
+    anime_metrics_interval: int = 60
+    """写入指标文件的间隔（秒）"""
+    anime_metrics_host: str = "127.0.0.1"
+    """指标 HTTP 服务监听的地址"""
+    anime_metrics_port: Optional[int] = None
+    """指标 HTTP 服务的端口，提供 `/metrics`，为空时不启动"""
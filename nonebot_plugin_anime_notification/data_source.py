@@ -1,7 +1,22 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+import json
+import time
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    ForeignKey,
+    Index,
+    Table,
+    inspect,
+    text,
+)
+from sqlalchemy.engine import Connection
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 
+from .models.myanimelist import AnimeDetail
 
 Base = declarative_base()
 AnimeSummaryBase = declarative_base()
@@ -19,35 +34,70 @@ class AnimeSummaryData(AnimeSummaryBase):
 
     id = Column(Integer, primary_key=True)
     data = Column(String)  # Store as JSON string
-    pagging = Column(String)  # Store as JSON string
     season = Column(String)  # Store as JSON string
     last_update = Column(Integer)  # Store as timestamp
 
 
+class FetchedSeason(AnimeSummaryBase):
+    __tablename__ = "fetched_seasons"
+
+    year = Column(Integer, primary_key=True)
+    season = Column(String, primary_key=True)
+    fetched_at = Column(Integer)  # Store as timestamp
+    row_count = Column(Integer)
+
+
 class AnimeDetailData(Base):
     __tablename__ = "anime_details"
 
     id = Column(Integer, primary_key=True)
     title = Column(String)
-    main_picture = Column(String)  # Store as JSON string
-    alternative_titles = Column(String)  # Store as JSON string
+    display_title = Column(String)
+    picture_url = Column(String)
+    picture_medium_url = Column(String)
+    alternative_titles = Column(String)  # Store as JSON string, 仅用于搜索
     start_date = Column(String)
     end_date = Column(String)
     synopsis = Column(String)
-    broadcast = Column(String)  # Store as JSON string
+    broadcast_day = Column(String, index=True)  # None 表示放送时间未知
+    broadcast_time = Column(String)  # HH:MM
     media_type = Column(String)
     status = Column(String)
     num_episodes = Column(Integer)
-    start_season = Column(String)  # Store as JSON string
+    season_year = Column(Integer)  # None 表示开播季度未知
+    season_name = Column(String)
     source = Column(String)
     average_episode_duration = Column(Integer)
     background = Column(String)
-    studios = Column(String)  # Store as JSON string
-    statistics = Column(String)  # Store as JSON string
+    last_update = Column(Integer)  # Store as timestamp, None 表示需要刷新
 
+    studios = relationship("AnimeStudio", lazy="selectin", cascade="all, delete-orphan")
+    statistics = relationship(
+        "AnimeStatistics", lazy="selectin", uselist=False, cascade="all, delete-orphan"
+    )
     groups = relationship("AnimeGroup", back_populates="anime")
 
 
+class AnimeStudio(Base):
+    __tablename__ = "anime_studios"
+
+    anime_id = Column(Integer, ForeignKey("anime_details.id"), primary_key=True)
+    studio_id = Column(Integer, primary_key=True)
+    name = Column(String)
+
+
+class AnimeStatistics(Base):
+    __tablename__ = "anime_statistics"
+
+    anime_id = Column(Integer, ForeignKey("anime_details.id"), primary_key=True)
+    watching = Column(Integer)
+    completed = Column(Integer)
+    on_hold = Column(Integer)
+    dropped = Column(Integer)
+    plan_to_watch = Column(Integer)
+    num_list_users = Column(Integer)
+
+
 class AnimeGroup(Base):
     __tablename__ = "anime_groups"
 
@@ -58,3 +108,277 @@ class AnimeGroup(Base):
 
     user = relationship("User", back_populates="anime_list")
     anime = relationship("AnimeDetailData", back_populates="groups")
+
+    __table_args__ = (
+        # 同一用户在同一个群中只能订阅一次；按用户、群查询订阅时也使用该索引
+        Index(
+            "ux_anime_groups_user_group_anime",
+            "user_id",
+            "group_id",
+            "anime_id",
+            unique=True,
+        ),
+        # 按番剧重新加载通知
+        Index("ix_anime_groups_anime_group", "anime_id", "group_id"),
+    )
+
+
+class GroupRoute(Base):
+    __tablename__ = "group_routes"
+
+    group_id = Column(String, primary_key=True)
+    bot_id = Column(String, primary_key=True)
+    last_seen = Column(Integer)  # Store as timestamp
+
+
+class NoticeOutbox(Base):
+    __tablename__ = "notice_outbox"
+
+    key = Column(String, primary_key=True)  # 群号@放送时刻，用于去重
+    group_id = Column(String)
+    air_time = Column(Integer)  # Store as timestamp
+    payload = Column(String)  # Store as JSON string
+    status = Column(String, index=True)  # pending, sent, expired
+    attempts = Column(Integer)
+    next_attempt = Column(Integer)  # Store as timestamp
+    last_error = Column(String)
+
+
+def get_display_title(title: str, alternative_titles: dict) -> str:
+    return (
+        alternative_titles.get("ja")
+        or alternative_titles.get("en")
+        or next(iter(alternative_titles.get("synonyms") or []), None)
+        or title
+    )
+
+
+def normalize_anime_detail(
+    anime_detail_dict: AnimeDetail,
+) -> Tuple[dict, List[dict], Optional[dict]]:
+    """将 MyAnimeList 返回的番剧详情拆分为详情表、制作公司表与统计表的列"""
+    main_picture = anime_detail_dict.get("main_picture") or {}
+    alternative_titles = anime_detail_dict.get("alternative_titles") or {}
+    broadcast = anime_detail_dict.get("broadcast") or {}
+    start_season = anime_detail_dict.get("start_season") or {}
+
+    columns = {
+        "id": anime_detail_dict["id"],
+        "title": anime_detail_dict["title"],
+        "display_title": get_display_title(
+            anime_detail_dict["title"], alternative_titles
+        ),
+        "picture_url": main_picture.get("large"),
+        "picture_medium_url": main_picture.get("medium"),
+        "alternative_titles": json.dumps(alternative_titles),
+        "start_date": anime_detail_dict.get("start_date", ""),
+        "end_date": anime_detail_dict.get("end_date", ""),
+        "synopsis": anime_detail_dict.get("synopsis", ""),
+        "broadcast_day": broadcast.get("day_of_the_week"),
+        "broadcast_time": broadcast.get("start_time"),
+        "media_type": anime_detail_dict.get("media_type", "unknown"),
+        "status": anime_detail_dict.get("status"),
+        "num_episodes": anime_detail_dict.get("num_episodes", 0),
+        "season_year": start_season.get("year"),
+        "season_name": start_season.get("season"),
+        "source": anime_detail_dict.get("source"),
+        "average_episode_duration": anime_detail_dict.get(
+            "average_episode_duration", 0
+        ),
+        "background": anime_detail_dict.get("background", ""),
+    }
+    # 旧数据中使用 "unknown" 表示未知
+    if columns["broadcast_day"] == "unknown":
+        columns["broadcast_day"] = None
+    if columns["season_year"] == "unknown":
+        columns["season_year"] = columns["season_name"] = None
+
+    studios = [
+        {"studio_id": studio["id"], "name": studio["name"]}
+        for studio in anime_detail_dict.get("studios") or []
+    ]
+
+    statistics = None
+    if (stats := anime_detail_dict.get("statistics")) is not None:
+        statistics = {
+            "watching": int(stats["status"]["watching"]),
+            "completed": int(stats["status"]["completed"]),
+            "on_hold": int(stats["status"]["on_hold"]),
+            "dropped": int(stats["status"]["dropped"]),
+            "plan_to_watch": int(stats["status"]["plan_to_watch"]),
+            "num_list_users": stats["num_list_users"],
+        }
+    return columns, studios, statistics
+
+
+def build_anime_detail(anime_detail_dict: AnimeDetail) -> AnimeDetailData:
+    columns, studios, statistics = normalize_anime_detail(anime_detail_dict)
+    return AnimeDetailData(
+        **columns,
+        last_update=int(time.time()),
+        studios=[AnimeStudio(**studio) for studio in studios],
+        statistics=AnimeStatistics(**statistics) if statistics is not None else None,
+    )
+
+
+def apply_anime_detail(
+    anime_detail: AnimeDetailData, anime_detail_dict: AnimeDetail
+) -> None:
+    """用新获取的番剧详情就地更新已有的行"""
+    columns, studios, statistics = normalize_anime_detail(anime_detail_dict)
+    for key, value in columns.items():
+        setattr(anime_detail, key, value)
+    anime_detail.last_update = int(time.time())
+
+    current = {studio.studio_id: studio for studio in anime_detail.studios}
+    rows = []
+    for studio in studios:
+        row = current.get(studio["studio_id"]) or AnimeStudio(
+            studio_id=studio["studio_id"]
+        )
+        row.name = studio["name"]
+        rows.append(row)
+    anime_detail.studios = rows
+
+    if statistics is None:
+        anime_detail.statistics = None
+    elif anime_detail.statistics is None:
+        anime_detail.statistics = AnimeStatistics(**statistics)
+    else:
+        for key, value in statistics.items():
+            setattr(anime_detail.statistics, key, value)
+
+
+def _add_missing_columns(connection: Connection, table: Table) -> Set[str]:
+    """为已有的表补上模型中新增的列与索引，返回补列前已有的列"""
+    columns = {column["name"] for column in inspect(connection).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in columns:
+            connection.execute(
+                text(
+                    f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                    f"{column.type.compile(connection.dialect)}"
+                )
+            )
+    for index in table.indexes:
+        index.create(connection, checkfirst=True)
+    return columns
+
+
+def _migrate_normalize_anime_details(connection: Connection) -> None:
+    """v1: 将 anime_details 中的 JSON 字符串列拆分为独立的列与子表"""
+    columns = _add_missing_columns(connection, AnimeDetailData.__table__)
+
+    legacy_columns = {
+        "main_picture",
+        "broadcast",
+        "start_season",
+        "studios",
+        "statistics",
+    }
+    if not legacy_columns <= columns:
+        return
+
+    rows = connection.execute(
+        text(
+            "SELECT id, title, main_picture, alternative_titles, start_date, "
+            "end_date, synopsis, broadcast, media_type, status, num_episodes, "
+            "start_season, source, average_episode_duration, background, studios, "
+            "statistics FROM anime_details WHERE display_title IS NULL"
+        )
+    ).mappings()
+    for row in rows.all():
+        anime_detail_dict = dict(row)
+        for key in ("main_picture", "alternative_titles", "broadcast", "start_season"):
+            anime_detail_dict[key] = json.loads(row[key] or "{}")
+        for key in ("studios", "statistics"):
+            anime_detail_dict[key] = json.loads(row[key] or "null")
+        # 旧数据从未写入 end_date
+        anime_detail_dict["end_date"] = row["end_date"] or ""
+
+        columns, studios, statistics = normalize_anime_detail(anime_detail_dict)
+        connection.execute(
+            AnimeDetailData.__table__.update()
+            .where(AnimeDetailData.__table__.c.id == row["id"])
+            .values(**columns)
+        )
+        if studios:
+            connection.execute(
+                AnimeStudio.__table__.insert().prefix_with("OR IGNORE"),
+                [{"anime_id": row["id"], **studio} for studio in studios],
+            )
+        if statistics is not None:
+            connection.execute(
+                AnimeStatistics.__table__.insert().prefix_with("OR REPLACE"),
+                {"anime_id": row["id"], **statistics},
+            )
+
+
+def _migrate_anime_detail_last_update(connection: Connection) -> None:
+    """v2: anime_details 增加 last_update，旧数据视为过期"""
+    _add_missing_columns(connection, AnimeDetailData.__table__)
+
+
+def _migrate_anime_group_indexes(connection: Connection) -> None:
+    """v3: 删除重复的订阅，为 anime_groups 建立索引与唯一约束"""
+    connection.execute(
+        text(
+            "DELETE FROM anime_groups WHERE id NOT IN ("
+            "SELECT MIN(id) FROM anime_groups GROUP BY user_id, group_id, anime_id)"
+        )
+    )
+    for index in AnimeGroup.__table__.indexes:
+        index.create(connection, checkfirst=True)
+
+
+USERS_DB_MIGRATIONS = [
+    _migrate_normalize_anime_details,
+    _migrate_anime_detail_last_update,
+    _migrate_anime_group_indexes,
+]
+
+
+def _migrate_backfill_fetched_seasons(connection: Connection) -> None:
+    """v1: 根据已有的番剧数据补全 fetched_seasons，避免升级后重复爬取"""
+    coverage = {}
+    for season, last_update in connection.execute(
+        text("SELECT season, last_update FROM anime_summary")
+    ):
+        season = json.loads(season)
+        key = (season["year"], season["season"])
+        fetched_at, row_count = coverage.get(key, (0, 0))
+        coverage[key] = (max(fetched_at, last_update or 0), row_count + 1)
+
+    if coverage:
+        connection.execute(
+            FetchedSeason.__table__.insert().prefix_with("OR IGNORE"),
+            [
+                {
+                    "year": year,
+                    "season": season,
+                    "fetched_at": fetched_at,
+                    "row_count": row_count,
+                }
+                for (year, season), (fetched_at, row_count) in coverage.items()
+            ],
+        )
+
+
+SUMMARY_DB_MIGRATIONS = [_migrate_backfill_fetched_seasons]
+
+
+def _upgrade(connection: Connection, migrations: list) -> None:
+    version = connection.execute(text("PRAGMA user_version")).scalar_one()
+    for index, migration in enumerate(migrations[version:], start=version):
+        migration(connection)
+        connection.execute(text(f"PRAGMA user_version = {index + 1}"))
+
+
+def upgrade_users_db(connection: Connection) -> None:
+    """按 `PRAGMA user_version` 依次执行 users.db 的迁移，需在 create_all 之后调用"""
+    _upgrade(connection, USERS_DB_MIGRATIONS)
+
+
+def upgrade_summary_db(connection: Connection) -> None:
+    """按 `PRAGMA user_version` 依次执行 anime_summary_data.db 的迁移"""
+    _upgrade(connection, SUMMARY_DB_MIGRATIONS)
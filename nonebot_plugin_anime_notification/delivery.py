@@ -0,0 +1,154 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import nonebot
+from nonebot.log import logger
+from nonebot_plugin_alconna import Target, UniMessage
+
+from .throttle import TokenBucket
+from .metrics import SEND_LATENCY, SENDS
+
+SendJob = Tuple[UniMessage, Target, "asyncio.Future[None]"]
+
+
+class BotQueue:
+    """单个机器人账号的发送队列，按令牌桶限速，并限制同时发送的消息数"""
+
+    def __init__(self, bot_id: str, rate: float, burst: int, concurrency: int) -> None:
+        self.bot_id = bot_id
+        self._bucket = TokenBucket(rate, burst)
+        self._concurrency = concurrency
+        self._queue: Optional["asyncio.Queue[SendJob]"] = None
+        self._workers: List[asyncio.Task] = []
+        self._active = 0
+
+    def __len__(self) -> int:
+        """排队中与发送中的消息数"""
+        return (self._queue.qsize() if self._queue is not None else 0) + self._active
+
+    async def send(self, message: UniMessage, group_id: str) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self._concurrency)
+            ]
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(
+            (message, Target(group_id, "", False, False, self_id=self.bot_id), future)
+        )
+        await future
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                *_, future = self._queue.get_nowait()
+                future.cancel()
+            self._queue = None
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            message, target, future = await self._queue.get()
+            self._active += 1
+            try:
+                await self._bucket.acquire()
+                with SEND_LATENCY.time():
+                    await message.send(target, nonebot.get_bot(self.bot_id))
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                SENDS.inc(result="error")
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                SENDS.inc(result="ok")
+                if not future.done():
+                    future.set_result(None)
+            finally:
+                self._active -= 1
+
+
+class Delivery:
+    """将消息路由到能发送到目标群的机器人，并通过各机器人的发送队列发出
+
+    群与机器人的对应关系从收到的群消息中学习，新的路由在后台保存；同一群有
+    多个可用机器人时，选择队列最短的一个。没有已知路由时退回任意一个在线的
+    机器人。
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        concurrency: int,
+        save_route: Optional[Callable[[str, str], Awaitable[None]]] = None,
+    ) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._concurrency = concurrency
+        self._save_route = save_route
+        self._routes: Dict[str, Dict[str, None]] = {}
+        self._queues: Dict[str, BotQueue] = {}
+        self._saving: Set[asyncio.Task] = set()
+
+    def add_route(self, group_id: str, bot_id: str) -> bool:
+        """记录机器人可以发送到该群，返回是否为新的路由"""
+        bots = self._routes.setdefault(group_id, {})
+        if bot_id in bots:
+            return False
+        bots[bot_id] = None
+        return True
+
+    def learn_route(self, group_id: str, bot_id: str) -> None:
+        """记录路由，只有新的路由才会保存，且不等待保存完成"""
+        if self.add_route(group_id, bot_id) and self._save_route is not None:
+            task = asyncio.create_task(self._persist_route(group_id, bot_id))
+            self._saving.add(task)
+            task.add_done_callback(self._saving.discard)
+
+    async def _persist_route(self, group_id: str, bot_id: str) -> None:
+        assert self._save_route is not None
+        try:
+            await self._save_route(group_id, bot_id)
+        except Exception as e:
+            # 忘记该路由，下次收到该群的消息时重新保存
+            self._routes.get(group_id, {}).pop(bot_id, None)
+            logger.warning(
+                f"保存群 {group_id} 的机器人 {bot_id} 路由失败: "
+                f"{e.__class__.__name__}: {e}"
+            )
+
+    def _queue(self, bot_id: str) -> BotQueue:
+        queue = self._queues.get(bot_id)
+        if queue is None:
+            queue = self._queues[bot_id] = BotQueue(
+                bot_id, self._rate, self._burst, self._concurrency
+            )
+        return queue
+
+    def pick_bot(self, group_id: str) -> Optional[str]:
+        bots = nonebot.get_bots()
+        candidates = [
+            bot_id for bot_id in self._routes.get(group_id, {}) if bot_id in bots
+        ]
+        if not candidates:
+            if not bots:
+                return None
+            logger.debug(f"群 {group_id} 没有已知的可用机器人，使用任意在线机器人发送")
+            candidates = list(bots)
+        return min(candidates, key=lambda bot_id: len(self._queue(bot_id)))
+
+    async def send(self, group_id: str, message: UniMessage) -> None:
+        if (bot_id := self.pick_bot(group_id)) is None:
+            raise RuntimeError("没有在线的机器人")
+        await self._queue(bot_id).send(message, group_id)
+
+    async def stop(self) -> None:
+        await asyncio.gather(*self._saving, return_exceptions=True)
+        await asyncio.gather(*(queue.stop() for queue in self._queues.values()))
+        self._queues.clear()
@@ -0,0 +1,212 @@
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from nonebot.log import logger
+
+from .client import HttpClient
+from .singleflight import SingleFlight
+
+
+class CacheEntry:
+    __slots__ = ("data", "fetched_at", "etag", "last_modified")
+
+    def __init__(
+        self,
+        data: bytes,
+        fetched_at: float,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self.data = data
+        self.fetched_at = fetched_at
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def meta(self) -> dict:
+        return {
+            "fetched_at": self.fetched_at,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+        }
+
+
+class ImageCache:
+    """以 URL 哈希为键的图片缓存，内存热缓存 + 有容量上限的 LRU 磁盘缓存"""
+
+    def __init__(
+        self,
+        http: HttpClient,
+        directory: Path,
+        max_disk_bytes: int,
+        max_memory_bytes: int,
+        ttl: float,
+    ) -> None:
+        self._http = http
+        self._directory = directory
+        self._max_disk_bytes = max_disk_bytes
+        self._max_memory_bytes = max_memory_bytes
+        self._ttl = ttl
+
+        self._memory: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._memory_bytes = 0
+        # 磁盘 LRU 索引: key -> 文件大小，按最近使用排序
+        self._disk: "Optional[OrderedDict[str, int]]" = None
+        self._disk_bytes = 0
+        self._flight: SingleFlight[bytes] = SingleFlight()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        folder = self._directory / key[:2]
+        return folder / f"{key}.bin", folder / f"{key}.json"
+
+    async def get(self, url: str) -> bytes:
+        key = self.key(url)
+        # 同一 URL 的并发请求共用一次下载
+        return await self._flight.run(key, lambda: self._get(key, url))
+
+    async def _get(self, key: str, url: str) -> bytes:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+        else:
+            entry = await self._load(key)
+            if entry is not None:
+                self._remember(key, entry)
+
+        if entry is not None and time.time() - entry.fetched_at < self._ttl:
+            return entry.data
+
+        try:
+            fresh = await self._download(url, entry)
+        except Exception as e:
+            if entry is None:
+                raise
+            # 重新验证失败时继续使用过期的缓存
+            logger.warning(f"图片缓存重新验证失败: {e.__class__.__name__}: {e}")
+            return entry.data
+
+        self._remember(key, fresh)
+        await self._store(key, fresh, write_data=fresh is not entry)
+        return fresh.data
+
+    async def _download(self, url: str, entry: Optional[CacheEntry]) -> CacheEntry:
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = await self._http.get(url, headers=headers or None)
+        if response.status == 304 and entry is not None:
+            entry.fetched_at = time.time()
+            return entry
+        if response.status != 200:
+            raise Exception(f"Failed to fetch url: {response.text()}")
+        return CacheEntry(
+            response.body,
+            time.time(),
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+    def _remember(self, key: str, entry: CacheEntry) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old.data)
+        if len(entry.data) > self._max_memory_bytes:
+            return
+        self._memory[key] = entry
+        self._memory_bytes += len(entry.data)
+        while self._memory_bytes > self._max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted.data)
+
+    async def _load(self, key: str) -> Optional[CacheEntry]:
+        await self._ensure_index()
+        if key not in self._disk:
+            return None
+
+        data_path, meta_path = self._paths(key)
+
+        def read() -> Optional[CacheEntry]:
+            try:
+                data = data_path.read_bytes()
+                meta = json.loads(meta_path.read_text())
+                data_path.touch()
+            except (OSError, ValueError):
+                return None
+            return CacheEntry(
+                data, meta["fetched_at"], meta.get("etag"), meta.get("last_modified")
+            )
+
+        entry = await asyncio.get_running_loop().run_in_executor(None, read)
+        if entry is None:
+            self._disk_bytes -= self._disk.pop(key)
+        else:
+            self._disk.move_to_end(key)
+        return entry
+
+    async def _store(self, key: str, entry: CacheEntry, write_data: bool) -> None:
+        await self._ensure_index()
+        data_path, meta_path = self._paths(key)
+
+        def write() -> None:
+            data_path.parent.mkdir(parents=True, exist_ok=True)
+            if write_data or not data_path.exists():
+                data_path.write_bytes(entry.data)
+            meta_path.write_text(json.dumps(entry.meta()))
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, write)
+        except OSError as e:
+            logger.warning(f"写入图片缓存失败: {e.__class__.__name__}: {e}")
+            return
+
+        self._disk_bytes += len(entry.data) - self._disk.pop(key, 0)
+        self._disk[key] = len(entry.data)
+        await self._evict()
+
+    async def _evict(self) -> None:
+        evicted = []
+        while self._disk_bytes > self._max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            evicted.append(key)
+        if not evicted:
+            return
+
+        def remove() -> None:
+            for key in evicted:
+                for path in self._paths(key):
+                    path.unlink(missing_ok=True)
+
+        await asyncio.get_running_loop().run_in_executor(None, remove)
+
+    async def _ensure_index(self) -> None:
+        if self._disk is not None:
+            return
+
+        def scan():
+            files = []
+            for path in self._directory.glob("*/*.bin"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path.stem, stat.st_size))
+            return sorted(files)
+
+        files = await asyncio.get_running_loop().run_in_executor(None, scan)
+        if self._disk is not None:
+            return
+        self._disk = OrderedDict((key, size) for _, key, size in files)
+        self._disk_bytes = sum(self._disk.values())
@@ -0,0 +1,139 @@
+import json
+import sqlite3
+from datetime import datetime
+from typing import List, NamedTuple, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .data_source import AnimeSummaryData, FetchedSeason
+from .models.myanimelist import AnimeData
+
+# SQLite 3.32 之前单条语句最多 999 个参数
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+season_map = {0: "winter", 1: "spring", 2: "summer", 3: "fall"}
+season_index_map = {v: k for k, v in season_map.items()}
+
+
+class IngestStats(NamedTuple):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+    def __add__(self, other: "IngestStats") -> "IngestStats":  # type: ignore
+        return IngestStats(*(a + b for a, b in zip(self, other)))
+
+
+def _chunks(rows: List[dict], size: int) -> List[List[dict]]:
+    return [rows[i : i + size] for i in range(0, len(rows), size)]
+
+
+def upsert_seasonal_page(session: Session, anime_data: AnimeData) -> IngestStats:
+    """将一页季度番剧数据以多行 upsert 写入，由调用方提交事务"""
+    now = int(datetime.now().timestamp())
+    season = json.dumps(anime_data["season"])
+    rows = {
+        data["node"]["id"]: {
+            "id": data["node"]["id"],
+            "data": json.dumps(data["node"]),
+            "season": season,
+            "last_update": now,
+        }
+        for data in anime_data["data"]
+    }
+    if not rows:
+        return IngestStats()
+
+    existing = {}
+    for ids in _chunks(list(rows), SQLITE_MAX_VARIABLES):
+        result = session.execute(
+            select(
+                AnimeSummaryData.id,
+                AnimeSummaryData.data,
+                AnimeSummaryData.season,
+            ).where(AnimeSummaryData.id.in_(ids))
+        )
+        existing.update({id: (data, season) for id, data, season in result})
+
+    changed = [
+        row
+        for id, row in rows.items()
+        if existing.get(id) != (row["data"], row["season"])
+    ]
+    stats = IngestStats(
+        inserted=sum(row["id"] not in existing for row in changed),
+        updated=sum(row["id"] in existing for row in changed),
+        unchanged=len(rows) - len(changed),
+    )
+
+    # 每行 4 个参数，一页通常只需一条语句
+    for chunk in _chunks(changed, SQLITE_MAX_VARIABLES // 4):
+        stmt = insert(AnimeSummaryData).values(chunk)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[AnimeSummaryData.id],
+                set_={
+                    "data": stmt.excluded.data,
+                    "season": stmt.excluded.season,
+                    "last_update": stmt.excluded.last_update,
+                },
+            )
+        )
+    return stats
+
+
+def upcoming_seasons(dt: datetime, count: int) -> List[Tuple[int, str]]:
+    """从 `dt` 所在季度开始的 `count` 个季度"""
+    index = dt.year * 4 + (dt.month - 1) // 3
+    return [(i // 4, season_map[i % 4]) for i in range(index, index + count)]
+
+
+async def missing_seasons(
+    session: AsyncSession, seasons: List[Tuple[int, str]], max_age: int
+) -> List[Tuple[int, str]]:
+    """返回 `seasons` 中尚未爬取或距上次爬取超过 `max_age` 秒的季度"""
+    if not seasons:
+        return []
+
+    now = int(datetime.now().timestamp())
+    result = await session.execute(
+        select(
+            FetchedSeason.year, FetchedSeason.season, FetchedSeason.fetched_at
+        ).where(
+            or_(
+                *(
+                    and_(FetchedSeason.year == year, FetchedSeason.season == season)
+                    for year, season in seasons
+                )
+            )
+        )
+    )
+    fresh = {
+        (year, season)
+        for year, season, fetched_at in result
+        if now - fetched_at < max_age
+    }
+    return [season for season in seasons if season not in fresh]
+
+
+def record_fetched_season(
+    session: Session, year: int, season: str, row_count: int
+) -> None:
+    stmt = insert(FetchedSeason).values(
+        year=year,
+        season=season,
+        fetched_at=int(datetime.now().timestamp()),
+        row_count=row_count,
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FetchedSeason.year, FetchedSeason.season],
+            set_={
+                "fetched_at": stmt.excluded.fetched_at,
+                "row_count": stmt.excluded.row_count,
+            },
+        )
+    )
@@ -0,0 +1,330 @@
+import os
+import time
+import asyncio
+from pathlib import Path
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Type
+
+from aiohttp import web
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, Sequence[str], Sequence[str], float]
+"""(后缀, 标签名, 标签值, 数值)"""
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    60,
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+        + "}"
+    )
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        self._values.clear()
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for suffix, names, values, value in self.samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(names, values)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in self._values.items():
+            yield "", self.labelnames, key, value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int) -> None:
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values: Dict[LabelValues, _HistogramValue] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        histogram = self._values.get(key)
+        if histogram is None:
+            histogram = self._values[key] = _HistogramValue(len(self.buckets))
+        # 只记录所在的桶，导出时再累加
+        histogram.buckets[bisect_left(self.buckets, value)] += 1
+        histogram.sum += value
+        histogram.count += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def quantile(self, q: float, **labels: str) -> Optional[float]:
+        """按桶上界估计分位数"""
+        histogram = self._values.get(self._key(labels))
+        if histogram is None or histogram.count == 0:
+            return None
+        rank = q * histogram.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, histogram.buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def samples(self) -> Iterator[Sample]:
+        names = self.labelnames + ("le",)
+        for key, histogram in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.buckets):
+                cumulative += count
+                yield "_bucket", names, key + (_format_value(bound),), cumulative
+            yield "_sum", self.labelnames, key, histogram.sum
+            yield "_count", self.labelnames, key, histogram.count
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(
+        self, name: str, documentation: str, labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(  # type: ignore
+            Histogram(name, documentation, labelnames, buckets)
+        )
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """供管理员命令查看的简要统计"""
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            if isinstance(metric, Counter):
+                for key, value in metric._values.items():
+                    lines.append(
+                        f"{metric.name}{_format_labels(metric.labelnames, key)}: "
+                        f"{_format_value(value)}"
+                    )
+            elif isinstance(metric, Histogram):
+                for key, histogram in metric._values.items():
+                    labels = dict(zip(metric.labelnames, key))
+                    p95 = metric.quantile(0.95, **labels)
+                    lines.append(
+                        f"{metric.name}{_format_labels(metric.labelnames, key)}: "
+                        f"{histogram.count} 次, "
+                        f"平均 {histogram.sum / histogram.count * 1000:.1f}ms, "
+                        f"p95 ≤ {_format_value(p95 * 1000) if p95 is not None else '-'}ms"
+                    )
+        return "\n".join(lines)
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "anime_http_requests_total",
+    "上游 HTTP 请求数",
+    ("upstream", "status"),
+)
+HTTP_LATENCY = registry.histogram(
+    "anime_http_request_seconds",
+    "上游 HTTP 请求耗时（含排队与重试）",
+    ("upstream",),
+)
+HTTP_RETRIES = registry.counter(
+    "anime_http_retries_total",
+    "上游 HTTP 请求重试次数",
+    ("upstream",),
+)
+HTTP_CACHE = registry.counter(
+    "anime_http_cache_total",
+    "API 响应缓存的查询结果（hit/shared/revalidated/miss）",
+    ("upstream", "result"),
+)
+IMAGE_FETCH_LATENCY = registry.histogram(
+    "anime_image_fetch_seconds",
+    "获取图片的耗时（含缓存）",
+)
+DB_COMMIT_LATENCY = registry.histogram(
+    "anime_db_commit_seconds",
+    "数据库事务提交耗时（含 flush）",
+    ("db",),
+)
+DB_WRITE_BATCH = registry.histogram(
+    "anime_db_write_batch_size",
+    "每个写事务合并的写操作数",
+    ("db",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_WRITE_WAIT = registry.histogram(
+    "anime_db_write_wait_seconds",
+    "写操作从排队到提交完成的耗时",
+    ("db",),
+)
+NOTICE_LAG = registry.histogram(
+    "anime_notice_lag_seconds",
+    "通知任务实际触发时间相对放送时刻的延迟",
+    buckets=(0.01, 0.1, 0.5, 1, 5, 30, 60, 300, 1800),
+)
+NOTICE_JOB_LATENCY = registry.histogram(
+    "anime_notice_job_seconds",
+    "通知任务的执行耗时",
+)
+SEND_LATENCY = registry.histogram(
+    "anime_send_seconds",
+    "发送消息的耗时（不含排队）",
+)
+SENDS = registry.counter(
+    "anime_sends_total",
+    "发送消息的次数",
+    ("result",),
+)
+
+
+def timed_session_class(db: str) -> Type[Session]:
+    """返回会记录事务提交耗时的 Session 子类，用作 `sync_session_class`"""
+    session_class = type(f"Timed{db.title()}Session", (Session,), {})
+
+    @event.listens_for(session_class, "before_commit")
+    def before_commit(session: Session) -> None:
+        session.info["commit_start"] = time.perf_counter()
+
+    @event.listens_for(session_class, "after_commit")
+    def after_commit(session: Session) -> None:
+        start = session.info.pop("commit_start", None)
+        if start is not None:
+            DB_COMMIT_LATENCY.observe(time.perf_counter() - start, db=db)
+
+    return session_class
+
+
+def _write_atomic(path: Path, content: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+async def dump_metrics(path: Path) -> None:
+    """将指标以 Prometheus 文本格式写入文件，供 node_exporter 的 textfile collector 读取"""
+    await asyncio.get_running_loop().run_in_executor(
+        None, _write_atomic, path, registry.render()
+    )
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -21,8 +21,9 @@ class Season(TypedDict):
     season: str
 
 
-class Paging(TypedDict):
-    pass  # 没有给出paging的具体结构，所以暂时留空
+class Paging(TypedDict, total=False):
+    previous: str
+    next: str
 
 
 class Picture(TypedDict):
@@ -59,8 +60,24 @@ class Broadcast(TypedDict):
     start_time: str
 
 
+class SeasonalNode(Node, total=False):
+    # 季度番剧列表通过 fields 参数额外请求的字段
+    alternative_titles: AlternativeTitles
+    start_date: str
+    end_date: str
+    media_type: str
+    status: str
+    num_episodes: int
+    start_season: Season
+    broadcast: Broadcast
+
+
+class SeasonalData(TypedDict):
+    node: SeasonalNode
+
+
 class AnimeData(TypedDict):
-    data: List[Data]
+    data: List[SeasonalData]
     paging: Paging
     season: Season
 
@@ -1,51 +1,272 @@
-from typing import List, Awaitable, TypedDict
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypedDict,
+)
+from nonebot.log import logger
+from apscheduler.events import EVENT_JOB_MISSED, JobExecutionEvent
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from .maps import day_of_the_week_num_map
+from .airing import AiringSchedule, Episode
+from .metrics import NOTICE_JOB_LATENCY, NOTICE_LAG
 
 
 class NoticeData(TypedDict):
-    day: str
-    hour: str
-    minute: str
-    func: Awaitable
     anime_id: int
     group_id: str
     user_id: str
+    schedule: Optional[AiringSchedule]
+    """番剧的放送日历，None 表示放送时间未知、已完结或尚未确定开播日期"""
+
+
+class NoticeBatch(NamedTuple):
+    """同一时刻发往同一个群的通知"""
+
+    group_id: str
+    subscriptions: Dict[int, List[str]]
+    """{番剧 ID: [订阅者]}"""
+    episodes: Dict[int, Optional[int]]
+    """{番剧 ID: 集数}"""
+
+
+NoticeHandler = Callable[[datetime, List[NoticeBatch]], Awaitable[None]]
+"""通知回调，参数为放送时刻与该时刻各群的通知"""
+
+NoticeKey = Tuple[int, str, str]
+"""订阅的唯一标识 (anime_id, group_id, user_id)"""
+
+
+class NoticeRecord:
+    __slots__ = ("anime_id", "group_id", "user_id")
+
+    def __init__(self, anime_id: int, group_id: str, user_id: str) -> None:
+        self.anime_id = anime_id
+        self.group_id = group_id
+        self.user_id = user_id
+
+    @property
+    def key(self) -> NoticeKey:
+        return (self.anime_id, self.group_id, self.user_id)
 
 
 class Notification:
-    def __init__(self, data: List[NoticeData]) -> None:
-        self.data: List[NoticeData] = data
+    """按放送日历索引订阅，只为每个番剧的下一次放送注册定时任务
+
+    同一时刻放送的番剧共用一个一次性任务；任务触发后为这些番剧排下一集，
+    番剧完结后不再排期。订阅的增删只修改索引。
+    事件循环阻塞等原因使任务晚于放送 `grace` 秒仍未执行时，跳过这次通知并排下一集。
+    """
+
+    def __init__(
+        self,
+        data: List[NoticeData],
+        handler: NoticeHandler,
+        grace: Optional[float] = None,
+    ) -> None:
+        self.handler = handler
+        self.grace = grace
         self.scheduler = AsyncIOScheduler()
+        self.scheduler.add_listener(self._on_missed, EVENT_JOB_MISSED)
+        self._records: Dict[NoticeKey, NoticeRecord] = {}
+        self._subscribers: Dict[int, Dict[NoticeKey, NoticeRecord]] = {}
+        self._schedules: Dict[int, AiringSchedule] = {}
+        self._upcoming: Dict[int, Episode] = {}
+        self._slots: Dict[datetime, Set[int]] = {}
+        for notice in data:
+            self._index(notice)
 
-    async def update_notification(self) -> None:
-        # 删除原有的定时任务，重新添加新的定时任务
-        self.scheduler.remove_all_jobs()
-        for notice in self.data:
-            self.scheduler.add_job(
-                notice["func"],
-                "cron",
-                day_of_week=day_of_the_week_num_map[notice["day"]],
-                # day_of_week 0-6 代表周一到周日
-                hour=notice["hour"],
-                minute=notice["minute"],
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def upcoming(self, anime_id: int) -> Optional[Episode]:
+        """番剧已排期的下一次放送"""
+        return self._upcoming.get(anime_id)
+
+    @staticmethod
+    def _job_id(air_time: datetime) -> str:
+        return f"air-{air_time:%Y%m%d%H%M}"
+
+    @staticmethod
+    def _air_time(job_id: str) -> Optional[datetime]:
+        try:
+            return datetime.strptime(job_id, "air-%Y%m%d%H%M")
+        except ValueError:
+            return None
+
+    def _index(self, notice: NoticeData) -> None:
+        record = NoticeRecord(notice["anime_id"], notice["group_id"], notice["user_id"])
+        self._unindex(record.key)
+
+        self._records[record.key] = record
+        self._subscribers.setdefault(record.anime_id, {})[record.key] = record
+
+        schedule = notice["schedule"]
+        if schedule is None:
+            self._schedules.pop(record.anime_id, None)
+            self._unschedule(record.anime_id)
+        elif self._schedules.get(record.anime_id) != schedule:
+            self._schedules[record.anime_id] = schedule
+            self._unschedule(record.anime_id)
+            self._schedule(record.anime_id, datetime.now())
+
+    def _unindex(self, key: NoticeKey) -> None:
+        record = self._records.pop(key, None)
+        if record is None:
+            return
+        subscribers = self._subscribers[record.anime_id]
+        del subscribers[key]
+        if not subscribers:
+            del self._subscribers[record.anime_id]
+            self._schedules.pop(record.anime_id, None)
+            self._unschedule(record.anime_id)
+
+    def _schedule(self, anime_id: int, after: datetime) -> None:
+        schedule = self._schedules.get(anime_id)
+        episode = schedule.next_episode(after) if schedule is not None else None
+        if episode is None:
+            # 已完结，不再排期
+            return
+
+        self._upcoming[anime_id] = episode
+        animes = self._slots.get(episode.air_time)
+        if animes is None:
+            animes = self._slots[episode.air_time] = set()
+            if self.scheduler.running:
+                self._add_job(episode.air_time)
+        animes.add(anime_id)
+
+    def _unschedule(self, anime_id: int) -> None:
+        episode = self._upcoming.pop(anime_id, None)
+        if episode is None:
+            return
+        animes = self._slots[episode.air_time]
+        animes.discard(anime_id)
+        if not animes:
+            del self._slots[episode.air_time]
+            if self.scheduler.running:
+                try:
+                    self.scheduler.remove_job(self._job_id(episode.air_time))
+                except JobLookupError:
+                    # 任务已触发或已错过
+                    pass
+
+    def _add_job(self, air_time: datetime) -> None:
+        self.scheduler.add_job(
+            self._fire,
+            "date",
+            args=(air_time,),
+            id=self._job_id(air_time),
+            replace_existing=True,
+            run_date=air_time,
+            misfire_grace_time=self.grace,
+            coalesce=True,
+        )
+
+    def _on_missed(self, event: JobExecutionEvent) -> None:
+        air_time = self._air_time(event.job_id)
+        if air_time is None:
+            return
+        # 任务已被调度器移除，为该时刻的番剧排下一集，避免留下无任务的时刻
+        animes = self._slots.pop(air_time, set())
+        for anime_id in animes:
+            self._upcoming.pop(anime_id, None)
+            self._schedule(anime_id, air_time)
+        if animes:
+            logger.warning(
+                f"{air_time:%Y-%m-%d %H:%M} 的番剧通知超过 {self.grace}s 未能执行，"
+                f"已跳过 {len(animes)} 部番剧"
+            )
+
+    def _batches(self, episodes: Dict[int, Optional[int]]) -> List[NoticeBatch]:
+        # 同一个群在同一时刻的订阅合并为一条消息
+        subscriptions: Dict[str, Dict[int, List[str]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for anime_id in episodes:
+            for record in self._subscribers.get(anime_id, {}).values():
+                subscriptions[record.group_id][anime_id].append(record.user_id)
+        return [
+            NoticeBatch(
+                group_id,
+                dict(animes),
+                {anime_id: episodes[anime_id] for anime_id in animes},
+            )
+            for group_id, animes in subscriptions.items()
+        ]
+
+    async def _notify(
+        self, air_time: datetime, episodes: Dict[int, Optional[int]]
+    ) -> None:
+        batches = self._batches(episodes)
+        if not batches:
+            return
+        try:
+            await self.handler(air_time, batches)
+        except Exception as e:
+            logger.error(
+                f"{air_time:%Y-%m-%d %H:%M} 的番剧通知处理失败: "
+                f"{e.__class__.__name__}: {e}"
             )
+
+    async def _fire(self, air_time: datetime) -> None:
+        NOTICE_LAG.observe(max((datetime.now() - air_time).total_seconds(), 0))
+        with NOTICE_JOB_LATENCY.time():
+            episodes: Dict[int, Optional[int]] = {}
+            for anime_id in self._slots.pop(air_time, set()):
+                episodes[anime_id] = self._upcoming.pop(anime_id).number
+                self._schedule(anime_id, air_time)
+            await self._notify(air_time, episodes)
+
+    async def update_notification(self, catch_up: float = 0) -> None:
+        """重建所有放送时刻的定时任务，仅在启动时需要
+
+        `catch_up` 秒内错过的放送（例如重启期间）会立即补发。
+        """
+        self.scheduler.remove_all_jobs()
+        now = datetime.now()
+
+        missed: Dict[datetime, Dict[int, Optional[int]]] = defaultdict(dict)
+        since = now - timedelta(seconds=catch_up)
+        for anime_id, schedule in self._schedules.items():
+            episode = schedule.next_episode(since)
+            while episode is not None and episode.air_time <= now:
+                missed[episode.air_time][anime_id] = episode.number
+                episode = schedule.next_episode(episode.air_time)
+
+        for anime_id, episode in list(self._upcoming.items()):
+            # 启动耗时可能错过了最近的一次放送
+            if episode.air_time <= now:
+                self._unschedule(anime_id)
+                self._schedule(anime_id, now)
+        for air_time in self._slots:
+            self._add_job(air_time)
         if not self.scheduler.running:
             self.scheduler.start()
 
+        for air_time in sorted(missed):
+            await self._notify(air_time, missed[air_time])
+
     async def add_notification(self, notice: NoticeData) -> None:
-        self.data.append(notice)
-        await self.update_notification()
+        await self.add_notifications([notice])
+
+    async def add_notifications(self, notices: List[NoticeData]) -> None:
+        # 同一番剧的多条订阅只会排期一次
+        for notice in notices:
+            self._index(notice)
+
+    async def remove_notification(self, key: NoticeKey) -> None:
+        await self.remove_notifications([key])
 
-    async def remove_notification(self, notice: NoticeData) -> None:
+    async def remove_notifications(self, keys: List[NoticeKey]) -> None:
         # 使用 anime_id, group_id, user_id 作为唯一标识
-        for i, n in enumerate(self.data):
-            if (
-                n["anime_id"] == notice["anime_id"]
-                and n["group_id"] == notice["group_id"]
-                and n["user_id"] == notice["user_id"]
-            ):
-                self.data.pop(i)
-                break
-        await self.update_notification()
+        for key in keys:
+            self._unindex(key)
@@ -0,0 +1,241 @@
+import json
+import time
+import random
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from nonebot.log import logger
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .data_source import NoticeOutbox
+from .notice import NoticeBatch
+from .writer import Writer
+
+OutboxSender = Callable[
+    [str, Dict[int, List[str]], Dict[int, Optional[int]]], Awaitable[None]
+]
+
+# 已发送或放弃的记录保留一段时间，防止补发时重复
+RETENTION = 7 * 24 * 60 * 60
+
+
+def outbox_key(group_id: str, air_time: datetime) -> str:
+    """幂等键，同一群同一放送时刻只会有一条记录"""
+    return f"{group_id}@{air_time:%Y%m%d%H%M}"
+
+
+class Outbox:
+    """持久化的通知发件箱
+
+    到点的通知先写入 SQLite，再由后台任务发送；发送失败按指数退避（最长
+    `backoff_max` 秒）持续重试，直到放送后 `grace` 秒仍未发出时放弃。
+
+    每条通知单独发送，最长等待 `timeout` 秒，发送结果立即写回数据库；
+    发送中的通知不会阻塞之后到期的通知。
+    """
+
+    def __init__(
+        self,
+        writer: Writer,
+        send: OutboxSender,
+        backoff: float,
+        backoff_max: float,
+        grace: float,
+        timeout: float,
+    ) -> None:
+        self._writer = writer
+        self._send = send
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._grace = grace
+        self._timeout = timeout
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def enqueue(self, air_time: datetime, batches: List[NoticeBatch]) -> None:
+        now = int(time.time())
+        rows = [
+            {
+                "key": outbox_key(batch.group_id, air_time),
+                "group_id": batch.group_id,
+                "air_time": int(air_time.timestamp()),
+                "payload": json.dumps(
+                    {
+                        "subscriptions": batch.subscriptions,
+                        "episodes": batch.episodes,
+                    }
+                ),
+                "status": "pending",
+                "attempts": 0,
+                "next_attempt": now,
+            }
+            for batch in batches
+        ]
+        if not rows:
+            return
+        # 逐行参数以 executemany 执行，不受 SQLite 单条语句变量数的限制
+        stmt = insert(NoticeOutbox).on_conflict_do_nothing(
+            index_elements=[NoticeOutbox.key]
+        )
+        await self._writer.submit(lambda session: session.execute(stmt, rows))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        # 未完成的发送保持 pending，下次启动后补发
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            self._wakeup.clear()
+            try:
+                delay = await self._drain()
+            except Exception as e:
+                logger.error(f"处理通知发件箱失败: {e.__class__.__name__}: {e}")
+                delay = self._backoff
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _drain(self) -> Optional[float]:
+        """开始发送所有到期且不在发送中的通知，返回距下一条待发送通知的秒数"""
+        now = int(time.time())
+        inflight = set(self._inflight)
+
+        def claim(
+            session: Session,
+        ) -> Tuple[List[NoticeOutbox], List[NoticeOutbox], Optional[int]]:
+            expired = [
+                row
+                for row in session.scalars(
+                    select(NoticeOutbox).where(
+                        NoticeOutbox.status == "pending",
+                        NoticeOutbox.air_time < now - self._grace,
+                    )
+                )
+                if row.key not in inflight
+            ]
+            for row in expired:
+                row.status = "expired"
+            session.execute(
+                delete(NoticeOutbox).where(
+                    NoticeOutbox.status != "pending",
+                    NoticeOutbox.air_time < now - RETENTION,
+                )
+            )
+            due = [
+                row
+                for row in session.scalars(
+                    select(NoticeOutbox).where(
+                        NoticeOutbox.status == "pending",
+                        NoticeOutbox.next_attempt <= now,
+                    )
+                )
+                if row.key not in inflight
+            ]
+            next_attempt = session.scalar(
+                select(func.min(NoticeOutbox.next_attempt)).where(
+                    NoticeOutbox.status == "pending",
+                    NoticeOutbox.next_attempt > now,
+                )
+            )
+            return expired, due, next_attempt
+
+        expired, due, next_attempt = await self._writer.submit(claim)
+        for row in expired:
+            air_time = datetime.fromtimestamp(row.air_time)
+            logger.error(
+                f"群 {row.group_id} {air_time:%Y-%m-%d %H:%M} 的番剧通知"
+                f"超过 {self._grace}s 仍未发出，已放弃"
+                f"（尝试 {row.attempts} 次，最后的错误: {row.last_error}）"
+            )
+        for row in due:
+            self._inflight[row.key] = asyncio.create_task(self._attempt(row))
+        if next_attempt is None:
+            return None
+        return max(next_attempt - time.time(), 0)
+
+    async def _attempt(self, row: NoticeOutbox) -> None:
+        """发送一条通知并写回结果，完成后唤醒后台任务重新计算等待时间"""
+        try:
+            try:
+                await asyncio.wait_for(self._deliver(row), self._timeout)
+            except Exception as e:
+                error: Optional[Exception] = e
+            else:
+                error = None
+            await self._record(row, error)
+        except Exception as e:
+            logger.error(
+                f"记录群 {row.group_id} 的番剧通知发送结果失败: "
+                f"{e.__class__.__name__}: {e}"
+            )
+        finally:
+            self._inflight.pop(row.key, None)
+            if self._wakeup is not None:
+                self._wakeup.set()
+
+    async def _record(self, row: NoticeOutbox, error: Optional[Exception]) -> None:
+        now = int(time.time())
+        row.attempts += 1
+        if error is None:
+            row.status = "sent"
+            row.last_error = None
+        else:
+            row.last_error = f"{error.__class__.__name__}: {error}"
+            # 指数退避并加入随机抖动，最后一次尝试不晚于放弃的时刻
+            delay = min(
+                random.uniform(1, 2) * self._backoff * 2 ** min(row.attempts - 1, 30),
+                self._backoff_max,
+            )
+            row.next_attempt = max(
+                min(now + int(delay), row.air_time + int(self._grace)), now + 1
+            )
+            logger.warning(
+                f"群 {row.group_id} 的番剧通知发送失败，稍后重试: {row.last_error}"
+            )
+
+        await self._writer.submit(
+            lambda session: session.execute(
+                update(NoticeOutbox)
+                .where(
+                    NoticeOutbox.key == row.key,
+                    NoticeOutbox.status == "pending",
+                )
+                .values(
+                    status=row.status,
+                    attempts=row.attempts,
+                    next_attempt=row.next_attempt,
+                    last_error=row.last_error,
+                )
+            )
+        )
+
+    async def _deliver(self, row: NoticeOutbox) -> None:
+        payload = json.loads(row.payload)
+        await self._send(
+            row.group_id,
+            {int(k): v for k, v in payload["subscriptions"].items()},
+            {int(k): v for k, v in payload["episodes"].items()},
+        )
@@ -0,0 +1,76 @@
+import random
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from nonebot.log import logger
+
+from .models.myanimelist import AnimeDetail
+
+
+class DetailRefresher:
+    """在后台分批刷新过期的番剧详情
+
+    同一番剧只排队一次；每批最多 `batch_size` 部，批次之间间隔 `interval` 秒
+    （带随机抖动），避免热门番剧同时过期时集中请求上游。
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[int], Awaitable[AnimeDetail]],
+        save: Callable[[Dict[int, AnimeDetail]], Awaitable[None]],
+        batch_size: int,
+        interval: float,
+    ) -> None:
+        self._fetch = fetch
+        self._save = save
+        self._batch_size = batch_size
+        self._interval = interval
+        self._pending: Dict[int, None] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def schedule(self, anime_id: int) -> None:
+        self._pending[anime_id] = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while self._pending:
+            batch: List[int] = list(self._pending)[: self._batch_size]
+            results = await asyncio.gather(
+                *(self._fetch(anime_id) for anime_id in batch),
+                return_exceptions=True,
+            )
+
+            details: Dict[int, AnimeDetail] = {}
+            for anime_id, result in zip(batch, results):
+                self._pending.pop(anime_id, None)
+                if isinstance(result, Exception):
+                    logger.warning(
+                        f"刷新番剧 {anime_id} 的信息失败: "
+                        f"{result.__class__.__name__}: {result}"
+                    )
+                else:
+                    details[anime_id] = result
+
+            if details:
+                try:
+                    await self._save(details)
+                except Exception as e:
+                    logger.error(f"保存刷新的番剧信息失败: {e.__class__.__name__}: {e}")
+                else:
+                    logger.debug(f"已刷新 {len(details)} 部番剧的信息")
+
+            if self._pending:
+                await asyncio.sleep(self._interval * random.uniform(0.5, 1.5))
@@ -0,0 +1,76 @@
+from collections import OrderedDict
+from typing import Optional
+
+from .data_source import AnimeDetailData
+from .maps import (
+    media_type_map,
+    status_map,
+    source_map,
+    season_cn_map,
+    day_of_the_week_map,
+)
+
+
+def render_anime_info(anime_detail: AnimeDetailData) -> str:
+    statistics = anime_detail.statistics
+
+    text = f"{anime_detail.display_title}\n"
+    text += f"共 {anime_detail.num_episodes} 集, {status_map[anime_detail.status]}\n"
+    text += f"开始放送时间: {anime_detail.start_date}, 是 {anime_detail.season_year} 年 {season_cn_map[anime_detail.season_name]}季番\n" if anime_detail.season_year is not None else "开始放送时间: 未知\n"
+    text += f"放送时间: 每{day_of_the_week_map[anime_detail.broadcast_day]} {anime_detail.broadcast_time}\n" if anime_detail.broadcast_day is not None else "放送时间: 未知\n"
+    text += f"类型: {source_map[anime_detail.source]} {media_type_map[anime_detail.media_type]}\n"
+    text += (
+        f"每集平均时长: {round(anime_detail.average_episode_duration / 60, 2)} 分钟\n"
+    )
+    text += f"制作公司: {', '.join([studio.name for studio in anime_detail.studios])}\n"
+    # MyAnimeList 未返回统计数据时详情没有对应的统计行
+    if statistics is not None:
+        text += f"观看详情: {statistics.watching} 正在观看, {statistics.completed} 已观看, {statistics.on_hold} 暂时搁置, {statistics.dropped} 弃坑, {statistics.plan_to_watch} 计划观看\n"
+        text += f"共 {statistics.num_list_users} 人观看"
+    else:
+        text += "观看详情: 未知"
+    return text
+
+
+class RenderedCard:
+    """渲染好的番剧信息卡片，没有封面时 `picture_url` 为 None，只发送文字"""
+
+    __slots__ = ("version", "text", "picture_url")
+
+    def __init__(
+        self, version: Optional[int], text: str, picture_url: Optional[str]
+    ) -> None:
+        self.version = version
+        self.text = text
+        self.picture_url = picture_url
+
+
+class CardCache:
+    """按番剧 ID 缓存渲染好的番剧信息卡片，详情行的 last_update 变化时自动失效"""
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size = max_size
+        self._cards: "OrderedDict[int, RenderedCard]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cards)
+
+    def get(self, anime_detail: AnimeDetailData) -> RenderedCard:
+        card = self._cards.get(anime_detail.id)
+        if card is not None and card.version == anime_detail.last_update:
+            self._cards.move_to_end(anime_detail.id)
+            return card
+
+        card = RenderedCard(
+            anime_detail.last_update,
+            render_anime_info(anime_detail),
+            anime_detail.picture_url,
+        )
+        self._cards[anime_detail.id] = card
+        self._cards.move_to_end(anime_detail.id)
+        while len(self._cards) > self._max_size:
+            self._cards.popitem(last=False)
+        return card
+
+    def invalidate(self, anime_id: int) -> None:
+        self._cards.pop(anime_id, None)
@@ -0,0 +1,125 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from yarl import URL
+
+from .client import HttpClient, Response
+from .metrics import HTTP_CACHE
+from .singleflight import SingleFlight
+
+
+def request_key(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """规范化的请求键：合并查询参数并按名称排序，主机名不区分大小写"""
+    parsed = URL(url)
+    query = [(k, v) for k, v in parsed.query.items()]
+    query += [(k, str(v)) for k, v in (params or {}).items()]
+    return str(parsed.with_query(sorted(query)))
+
+
+class CachedResponse:
+    __slots__ = ("response", "fetched_at")
+
+    def __init__(self, response: Response, fetched_at: float) -> None:
+        self.response = response
+        self.fetched_at = fetched_at
+
+
+class ResponseCache:
+    """API 响应的内存缓存，接口与 `HttpClient.get` 相同
+
+    - 每个请求指定缓存时间 `ttl`，为 0 时不缓存
+    - 过期的响应带有 ETag/Last-Modified 时发送条件请求，304 时继续使用
+    - 同一请求键的并发请求共用一次上游请求
+    - 最多保留 `max_entries` 条，按最近使用淘汰
+    """
+
+    def __init__(self, http: HttpClient, max_entries: int) -> None:
+        self.http = http
+        self._max_entries = max_entries
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._flight: SingleFlight[Response] = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    async def get(
+        self,
+        url: str,
+        *,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        upstream: Optional[str] = None,
+        deadline: Optional[float] = None,
+        ttl: float = 0,
+    ) -> Response:
+        label = upstream or "direct"
+        key = request_key(url, params)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.fetched_at < ttl:
+            self._entries.move_to_end(key)
+            HTTP_CACHE.inc(upstream=label, result="hit")
+            return entry.response
+
+        # 同一请求的并发调用共用一次上游请求
+        if key in self._flight:
+            HTTP_CACHE.inc(upstream=label, result="shared")
+        return await self._flight.run(
+            key,
+            lambda: self._fetch(
+                key, url, params, headers, upstream, deadline, ttl, entry
+            ),
+        )
+
+    async def _fetch(
+        self,
+        key: str,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+        upstream: Optional[str],
+        deadline: Optional[float],
+        ttl: float,
+        entry: Optional[CachedResponse],
+    ) -> Response:
+        label = upstream or "direct"
+        request_headers = dict(headers or {})
+        if entry is not None:
+            if etag := entry.response.headers.get("ETag"):
+                request_headers["If-None-Match"] = etag
+            if last_modified := entry.response.headers.get("Last-Modified"):
+                request_headers["If-Modified-Since"] = last_modified
+
+        response = await self.http.get(
+            url,
+            params=params,
+            headers=request_headers or None,
+            upstream=upstream,
+            deadline=deadline,
+        )
+        if response.status == 304 and entry is not None:
+            HTTP_CACHE.inc(upstream=label, result="revalidated")
+            entry.fetched_at = time.monotonic()
+            # 等待期间条目可能已被淘汰
+            self._store(key, entry)
+            return entry.response
+
+        HTTP_CACHE.inc(upstream=label, result="miss")
+        if (
+            response.status == 200
+            and ttl > 0
+            and "no-store" not in response.headers.get("Cache-Control", "")
+        ):
+            self._store(key, CachedResponse(response, time.monotonic()))
+        return response
+
+    def _store(self, key: str, entry: CachedResponse) -> None:
+        if self._max_entries <= 0:
+            return
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,127 @@
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rapidfuzz import fuzz, process, utils
+
+from .data_source import get_display_title
+
+
+class IndexedAnime:
+    __slots__ = ("id", "title", "image_url")
+
+    def __init__(self, id: int, title: str, image_url: Optional[str]) -> None:
+        self.id = id
+        self.title = title
+        self.image_url = image_url
+
+
+class TitleIndex:
+    """基于 rapidfuzz 的本地番剧标题模糊搜索索引
+
+    每部番剧的标题、日文/英文标题与别名都作为候选项，按番剧 ID 增量更新。
+    """
+
+    def __init__(self) -> None:
+        self._animes: Dict[int, IndexedAnime] = {}
+        # (anime_id, 序号) -> 预处理后的标题
+        self._choices: Dict[Tuple[int, int], str] = {}
+        self._title_count: Dict[int, int] = {}
+        # 搜索用的扁平候选列表，索引变化后在下次搜索时重建
+        self._flat: Optional[Tuple[List[str], List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self._animes)
+
+    def get(self, anime_id: int) -> Optional[IndexedAnime]:
+        return self._animes.get(anime_id)
+
+    def add(
+        self,
+        anime_id: int,
+        title: str,
+        alternative_titles: dict,
+        image_url: Optional[str],
+    ) -> None:
+        titles = [
+            title,
+            alternative_titles.get("ja"),
+            alternative_titles.get("en"),
+            *(alternative_titles.get("synonyms") or []),
+        ]
+        processed = list(
+            dict.fromkeys(
+                choice
+                for choice in map(utils.default_process, filter(None, titles))
+                if choice
+            )
+        )
+
+        for i in range(self._title_count.get(anime_id, 0)):
+            self._choices.pop((anime_id, i), None)
+        for i, choice in enumerate(processed):
+            self._choices[(anime_id, i)] = choice
+        self._title_count[anime_id] = len(processed)
+        self._flat = None
+
+        self._animes[anime_id] = IndexedAnime(
+            anime_id, get_display_title(title, alternative_titles), image_url
+        )
+
+    def add_node(self, node: dict) -> None:
+        """添加 MyAnimeList 季度番剧列表中的一项"""
+        # 不含别名的列表项不覆盖已由番剧详情建立的索引
+        if "alternative_titles" not in node and node["id"] in self._animes:
+            return
+        self.add(
+            node["id"],
+            node["title"],
+            node.get("alternative_titles") or {},
+            (node.get("main_picture") or {}).get("large"),
+        )
+
+    def add_nodes(self, nodes: Iterable[dict]) -> None:
+        for node in nodes:
+            self.add_node(node)
+
+    def search(
+        self, query: str, limit: int = 3, score_cutoff: float = 0
+    ) -> List[Tuple[IndexedAnime, float]]:
+        query = utils.default_process(query)
+        if not query or not self._choices:
+            return []
+
+        if self._flat is None:
+            self._flat = (
+                list(self._choices.values()),
+                [anime_id for anime_id, _ in self._choices],
+            )
+        choices, owners = self._flat
+
+        results: Dict[int, float] = {}
+        # 同一部番剧可能有多个标题命中，多取一些再按番剧去重
+        # 不使用 WRatio：其部分匹配会让 "a"、"no" 这类短查询命中任意标题
+        for _, score, i in process.extract(
+            query,
+            choices,
+            scorer=fuzz.token_sort_ratio,
+            processor=None,
+            limit=limit * 5,
+            score_cutoff=score_cutoff,
+        ):
+            if owners[i] not in results:
+                results[owners[i]] = score
+            if len(results) >= limit:
+                break
+        return [(self._animes[anime_id], score) for anime_id, score in results.items()]
+
+
+def load_summary_rows(index: TitleIndex, rows: Iterable[Tuple[str]]) -> None:
+    for (data,) in rows:
+        index.add_node(json.loads(data))
+
+
+def load_detail_rows(
+    index: TitleIndex, rows: Iterable[Tuple[int, str, str, Optional[str]]]
+) -> None:
+    for anime_id, title, alternative_titles, picture_url in rows:
+        index.add(anime_id, title, json.loads(alternative_titles or "{}"), picture_url)
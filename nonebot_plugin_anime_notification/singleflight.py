@@ -0,0 +1,34 @@
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """同一个键的并发调用共用一次执行
+
+    执行放在独立的任务中，调用者只等待其结果：任一调用者被取消（如处理器超时）
+    只会结束它自己的等待，不影响其他调用者。
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[Hashable, "asyncio.Future[T]"] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._pending[key] = task
+            task.add_done_callback(partial(self._done, key))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: "asyncio.Future[T]") -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        # 调用者都已取消时避免 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
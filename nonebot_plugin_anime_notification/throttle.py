@@ -0,0 +1,126 @@
+import random
+import asyncio
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+from nonebot.log import logger
+
+from .metrics import HTTP_RETRIES
+
+if TYPE_CHECKING:
+    from .client import Response
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated: Optional[float] = None
+        # 在事件循环中再创建，兼容 Python 3.8/3.9 的 loop 绑定
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self, now: float) -> None:
+        if self._updated is not None:
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 排队获取令牌，保证先到先得
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+                if deadline is not None and now + wait > deadline:
+                    raise asyncio.TimeoutError("Request deadline exceeded")
+                await asyncio.sleep(wait)
+
+
+class RequestScheduler:
+    """所有上游 API 请求的调度器: 分上游限速、并发上限、退避重试与截止时间"""
+
+    def __init__(
+        self,
+        buckets: Dict[str, TokenBucket],
+        concurrency: int,
+        retries: int,
+        backoff: float,
+        backoff_max: float,
+        timeout: float,
+    ) -> None:
+        self._buckets = buckets
+        self._concurrency = concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._retries = retries
+        self._backoff = backoff
+        self._backoff_max = backoff_max
+        self._timeout = timeout
+
+    def _delay(self, attempt: int, response: Optional["Response"]) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        # full jitter 指数退避
+        return random.uniform(0, min(self._backoff_max, self._backoff * 2**attempt))
+
+    async def run(
+        self,
+        upstream: str,
+        request: Callable[[], Awaitable["Response"]],
+        deadline: Optional[float] = None,
+    ) -> "Response":
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        if deadline is None:
+            deadline = loop.time() + self._timeout
+        bucket = self._buckets.get(upstream)
+
+        attempt = 0
+        while True:
+            response: Optional["Response"] = None
+            error: Optional[Exception] = None
+
+            if bucket is not None:
+                await bucket.acquire(deadline)
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError("Request deadline exceeded")
+
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), remaining)
+                try:
+                    response = await asyncio.wait_for(request(), deadline - loop.time())
+                finally:
+                    self._semaphore.release()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if response is not None and not (
+                response.status == 429 or response.status >= 500
+            ):
+                return response
+
+            delay = self._delay(attempt, response)
+            if attempt >= self._retries or loop.time() + delay >= deadline:
+                if error is not None:
+                    raise error
+                return response  # type: ignore
+
+            attempt += 1
+            HTTP_RETRIES.inc(upstream=upstream)
+            reason = repr(error) if error is not None else response.status  # type: ignore
+            logger.debug(
+                f"{upstream} 请求失败 ({reason}), {delay:.2f} 秒后第 {attempt} 次重试"
+            )
+            await asyncio.sleep(delay)
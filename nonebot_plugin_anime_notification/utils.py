@@ -1,9 +1,18 @@
-import aiohttp
+from typing import Optional
 
+from .client import HttpClient
+from .image_cache import ImageCache
+from .metrics import IMAGE_FETCH_LATENCY
 
-async def fetch_url(url: str) -> bytes:
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            if response.status != 200:
-                raise Exception(f"Failed to fetch url: {await response.text()}")
-            return await response.read()
+
+async def fetch_url(
+    http: HttpClient, url: str, cache: Optional[ImageCache] = None
+) -> bytes:
+    with IMAGE_FETCH_LATENCY.time():
+        if cache is not None:
+            return await cache.get(url)
+
+        response = await http.get(url)
+        if response.status != 200:
+            raise Exception(f"Failed to fetch url: {response.text()}")
+        return response.body
@@ -0,0 +1,127 @@
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from .metrics import DB_WRITE_BATCH, DB_WRITE_WAIT
+
+T = TypeVar("T")
+Mutation = Callable[[Session], T]
+"""写操作，在写入线程的事务中执行，不应自行提交"""
+WriteJob = Tuple[Mutation[Any], "asyncio.Future[Any]", float]
+
+
+def enable_wal(engine: Engine) -> None:
+    """新连接启用 WAL 模式，读操作不会被写操作阻塞"""
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 不会损坏数据库，只可能丢失断电前最后的事务
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-16000")
+        cursor.close()
+
+
+class Writer:
+    """数据库的唯一写入者
+
+    写操作排队后由一个后台任务收集：取到第一个写操作后等待 `interval` 秒，
+    期间排队的写操作（最多 `max_batch` 个）交给专用的写入线程在同一个事务中
+    执行并提交。整批只需切换一次线程，提交次数也不随并发写入的数量增加。
+    合并的事务失败时逐个重新执行，只让出错的写操作失败。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        session_factory: "sessionmaker[Session]",
+        interval: float,
+        max_batch: int,
+    ) -> None:
+        self.name = name
+        self._session_factory = session_factory
+        self._interval = interval
+        self._max_batch = max_batch
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional["asyncio.Queue[WriteJob]"] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, mutation: Mutation[T]) -> T:
+        """执行 `mutation(session)` 并等待事务提交，返回其结果
+
+        合并的事务失败时 `mutation` 会被再次执行，因此不应有数据库之外的副作用。
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._executor = ThreadPoolExecutor(1, f"anime-{self.name}-writer")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((mutation, future, time.perf_counter()))
+        return await future
+
+    async def stop(self) -> None:
+        # 等待已排队的写操作提交后再停止
+        if self._queue is not None and self._task is not None:
+            if not self._task.done():
+                await self._queue.join()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        assert self._queue is not None
+        while True:
+            batch = [await self._queue.get()]
+            if self._interval > 0:
+                await asyncio.sleep(self._interval)
+            while len(batch) < self._max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            DB_WRITE_BATCH.observe(len(batch), db=self.name)
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self._commit, [job[0] for job in batch]
+                )
+            except Exception as e:
+                results = [e] * len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            now = time.perf_counter()
+            for (_, future, queued), result in zip(batch, results):
+                DB_WRITE_WAIT.observe(now - queued, db=self.name)
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _commit(self, mutations: List[Mutation[Any]]) -> List[Any]:
+        """在写入线程中执行，返回每个写操作的结果或异常"""
+        try:
+            with self._session_factory.begin() as session:
+                return [mutation(session) for mutation in mutations]
+        except Exception as e:
+            if len(mutations) == 1:
+                return [e]
+        # 找出出错的写操作，其余的仍然提交
+        return [self._commit([mutation])[0] for mutation in mutations]
@@ -0,0 +1,33 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+import nonebot
+from nonebug import NONEBOT_INIT_KWARGS
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    data_dir = Path(tempfile.mkdtemp(prefix="anime-notification-test-"))
+    config.stash[NONEBOT_INIT_KWARGS] = {
+        "driver": "~none",
+        "mal_client_id": "test",
+        "localstore_data_dir": str(data_dir / "data"),
+        "localstore_cache_dir": str(data_dir / "cache"),
+        "localstore_config_dir": str(data_dir / "config"),
+    }
+
+
+@pytest.fixture(scope="session", autouse=True)
+def load_plugin(nonebug_init: None) -> None:
+    nonebot.require("nonebot_plugin_anime_notification")
+
+
+@pytest.fixture
+async def plugin():
+    from nonebot_plugin_anime_notification.data_source import Base
+    import nonebot_plugin_anime_notification as plugin
+
+    Base.metadata.create_all(plugin.users_write_engine)
+    yield plugin
+    await plugin.users_writer.stop()
+    await plugin.engine.dispose()
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+
+def test_first_episode_on_broadcast_weekday():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    # 2024-01-04 是周四，第 1 集在之后的第一个周六
+    schedule = AiringSchedule.from_detail(
+        "saturday", "23:30", "2024-01-04", num_episodes=12
+    )
+    assert schedule is not None
+
+    episode = schedule.next_episode(datetime(2024, 1, 1))
+    assert episode == (1, datetime(2024, 1, 6, 23, 30))
+    episode = schedule.next_episode(episode.air_time)
+    assert episode == (2, datetime(2024, 1, 13, 23, 30))
+
+
+def test_first_episode_on_start_date():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    schedule = AiringSchedule.from_detail("saturday", "01:00", "2024-01-06")
+    assert schedule is not None
+    assert schedule.next_episode(datetime(2024, 1, 1)) == (
+        1,
+        datetime(2024, 1, 6, 1, 0),
+    )
+
+
+def test_capped_at_num_episodes():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    schedule = AiringSchedule.from_detail(
+        "saturday", "23:30", "2024-01-06", num_episodes=12
+    )
+    assert schedule is not None
+
+    last = schedule.next_episode(datetime(2024, 3, 20))
+    assert last == (12, datetime(2024, 3, 23, 23, 30))
+    assert schedule.next_episode(last.air_time) is None
+
+
+def test_cut_off_at_end_date():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    schedule = AiringSchedule.from_detail(
+        "saturday", "23:30", "2024-01-06", "2024-01-20", num_episodes=24
+    )
+    assert schedule is not None
+
+    # 完结日期当天的放送仍然有效
+    last = schedule.next_episode(datetime(2024, 1, 14))
+    assert last == (3, datetime(2024, 1, 20, 23, 30))
+    assert schedule.next_episode(last.air_time) is None
+
+
+def test_unknown_start_date_airs_weekly():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    schedule = AiringSchedule.from_detail(
+        "monday", "12:00", "2024", status="currently_airing"
+    )
+    assert schedule is not None
+
+    # 2024-06-05 是周三
+    assert schedule.next_episode(datetime(2024, 6, 5)) == (
+        None,
+        datetime(2024, 6, 10, 12, 0),
+    )
+    assert schedule.next_episode(datetime(2024, 6, 10, 12, 0)) == (
+        None,
+        datetime(2024, 6, 17, 12, 0),
+    )
+
+
+def test_not_yet_aired_without_start_date():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    assert (
+        AiringSchedule.from_detail(
+            "saturday", "23:30", "2027-04", status="not_yet_aired"
+        )
+        is None
+    )
+
+    schedule = AiringSchedule.from_detail(
+        "saturday", "23:30", "2027-04-03", status="not_yet_aired"
+    )
+    assert schedule is not None
+    assert schedule.next_episode(datetime(2027, 1, 1)) == (
+        1,
+        datetime(2027, 4, 3, 23, 30),
+    )
+
+
+def test_no_schedule():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+
+    assert AiringSchedule.from_detail(None, None, "2024-01-06") is None
+    assert AiringSchedule.from_detail("saturday", None, "2024-01-06") is None
+    assert (
+        AiringSchedule.from_detail(
+            "saturday", "23:30", "2024-01-06", status="finished_airing"
+        )
+        is None
+    )
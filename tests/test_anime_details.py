@@ -0,0 +1,43 @@
+import asyncio
+
+from sqlalchemy import select
+
+from .utils import make_detail
+
+
+async def test_upstream_fetch_does_not_hold_a_connection(plugin, monkeypatch):
+    release = asyncio.Event()
+    started = []
+
+    async def get_anime_detail(anime_id: int) -> dict:
+        started.append(anime_id)
+        await release.wait()
+        return make_detail(anime_id)
+
+    monkeypatch.setattr(plugin.mal_api, "get_anime_detail", get_anime_detail)
+
+    # 比连接池（pool_size + max_overflow）更多的处理器同时等待上游
+    config = plugin.config
+    anime_ids = list(
+        range(1, config.anime_db_pool_size + config.anime_db_max_overflow + 3)
+    )
+    tasks = [
+        asyncio.create_task(plugin.get_anime_details([anime_id]))
+        for anime_id in anime_ids
+    ]
+    while len(started) < len(anime_ids):
+        await asyncio.sleep(0.01)
+
+    assert plugin.engine.sync_engine.pool.checkedout() == 0
+
+    async def other_handler() -> int:
+        async with plugin.Session() as session:
+            return (await session.execute(select(1))).scalar_one()
+
+    assert await asyncio.wait_for(other_handler(), 5) == 1
+
+    release.set()
+    results = await asyncio.gather(*tasks)
+    for anime_id, anime_details in zip(anime_ids, results):
+        assert anime_details[anime_id].display_title == f"アニメ {anime_id}"
+    assert plugin.engine.sync_engine.pool.checkedout() == 0
@@ -0,0 +1,43 @@
+import asyncio
+
+
+async def test_learn_route_saves_new_routes_in_background():
+    from nonebot_plugin_anime_notification.delivery import Delivery
+
+    release = asyncio.Event()
+    saved = []
+
+    async def save_route(group_id: str, bot_id: str) -> None:
+        await release.wait()
+        saved.append((group_id, bot_id))
+
+    delivery = Delivery(1, 1, 1, save_route=save_route)
+    # 保存未完成时不阻塞，重复的路由不会再次保存
+    delivery.learn_route("1", "10")
+    delivery.learn_route("1", "10")
+    assert saved == []
+
+    release.set()
+    await delivery.stop()
+    assert saved == [("1", "10")]
+
+
+async def test_learn_route_retries_after_save_failure():
+    from nonebot_plugin_anime_notification.delivery import Delivery
+
+    calls = []
+
+    async def save_route(group_id: str, bot_id: str) -> None:
+        calls.append((group_id, bot_id))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+
+    delivery = Delivery(1, 1, 1, save_route=save_route)
+    delivery.learn_route("1", "10")
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    delivery.learn_route("1", "10")
+    await delivery.stop()
+    assert calls == [("1", "10"), ("1", "10")]
+    assert delivery.add_route("1", "10") is False
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+
+
+async def test_missed_job_schedules_next_episode():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+    from nonebot_plugin_anime_notification.notice import Notification
+
+    fired = []
+
+    async def handler(air_time, batches):
+        fired.append(air_time)
+
+    schedule = AiringSchedule.from_detail("monday", "12:00")
+    notification = Notification(
+        [{"anime_id": 1, "group_id": "1", "user_id": "1", "schedule": schedule}],
+        handler,
+        grace=1,
+    )
+    await notification.update_notification()
+    try:
+        episode = notification.upcoming(1)
+        assert episode is not None
+        job_id = notification._job_id(episode.air_time)
+
+        # 模拟事件循环阻塞：任务到期时已超过 grace
+        notification.scheduler.modify_job(
+            job_id, next_run_time=datetime.now() - timedelta(minutes=5)
+        )
+        await asyncio.sleep(0.1)
+
+        assert fired == []
+        assert notification.scheduler.get_job(job_id) is None
+        upcoming = notification.upcoming(1)
+        assert upcoming is not None
+        assert upcoming.air_time == episode.air_time + timedelta(weeks=1)
+        assert notification.scheduler.get_job(notification._job_id(upcoming.air_time))
+
+        await notification.remove_notification((1, "1", "1"))
+        assert notification.upcoming(1) is None
+    finally:
+        notification.scheduler.shutdown(wait=False)
+
+
+async def test_unsubscribe_without_job():
+    from nonebot_plugin_anime_notification.airing import AiringSchedule
+    from nonebot_plugin_anime_notification.notice import Notification
+
+    async def handler(air_time, batches):
+        pass
+
+    schedule = AiringSchedule.from_detail("monday", "12:00")
+    notification = Notification(
+        [{"anime_id": 1, "group_id": "1", "user_id": "1", "schedule": schedule}],
+        handler,
+    )
+    await notification.update_notification()
+    try:
+        notification.scheduler.remove_all_jobs()
+        await notification.remove_notification((1, "1", "1"))
+        assert len(notification) == 0
+    finally:
+        notification.scheduler.shutdown(wait=False)
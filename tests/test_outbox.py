@@ -0,0 +1,195 @@
+import time
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select, update
+from sqlalchemy.orm import Session, sessionmaker
+
+GRACE = 30 * 60
+
+
+@pytest.fixture
+async def writer(tmp_path: Path):
+    from nonebot_plugin_anime_notification.writer import Writer
+    from nonebot_plugin_anime_notification.data_source import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    writer = Writer("test", sessionmaker(engine, expire_on_commit=False), 0, 500)
+    yield writer
+    await writer.stop()
+    engine.dispose()
+
+
+class FakeSender:
+    def __init__(self, failures: int = 0) -> None:
+        self.failures = failures
+        self.sent = []
+
+    async def __call__(self, group_id, subscriptions, episodes) -> None:
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError("bot offline")
+        self.sent.append((group_id, subscriptions, episodes))
+
+
+def make_outbox(writer, send, timeout: float = 60):
+    from nonebot_plugin_anime_notification.outbox import Outbox
+
+    return Outbox(
+        writer, send, backoff=10, backoff_max=60, grace=GRACE, timeout=timeout
+    )
+
+
+async def drain(outbox):
+    """发送到期的通知并等待结果写回"""
+    delay = await outbox._drain()
+    await asyncio.gather(*outbox._inflight.values())
+    return delay
+
+
+def batch(group_id: str = "1"):
+    from nonebot_plugin_anime_notification.notice import NoticeBatch
+
+    return NoticeBatch(group_id, {1: ["100"]}, {1: 3})
+
+
+async def rows(writer):
+    from nonebot_plugin_anime_notification.data_source import NoticeOutbox
+
+    def load(session: Session):
+        return list(session.scalars(select(NoticeOutbox)))
+
+    return await writer.submit(load)
+
+
+async def make_due(writer):
+    from nonebot_plugin_anime_notification.data_source import NoticeOutbox
+
+    await writer.submit(
+        lambda session: session.execute(
+            update(NoticeOutbox).values(next_attempt=int(time.time()))
+        )
+    )
+
+
+async def test_enqueue_is_idempotent(writer):
+    send = FakeSender()
+    outbox = make_outbox(writer, send)
+    air_time = datetime.now().replace(second=0, microsecond=0)
+
+    await outbox.enqueue(air_time, [batch("1"), batch("2")])
+    await outbox.enqueue(air_time, [batch("1")])
+    assert len(await rows(writer)) == 2
+
+    await drain(outbox)
+    assert sorted(group_id for group_id, _, _ in send.sent) == ["1", "2"]
+    assert send.sent[0][1:] == ({1: ["100"]}, {1: 3})
+
+    # 发送后重复入队（如重启后补发）不会再次发送
+    await outbox.enqueue(air_time, [batch("1")])
+    await drain(outbox)
+    assert len(send.sent) == 2
+
+
+async def test_retries_until_grace(writer):
+    send = FakeSender(failures=10)
+    outbox = make_outbox(writer, send)
+    await outbox.enqueue(datetime.now(), [batch()])
+
+    # 不限制重试次数，只要仍在 grace 内就继续重试
+    for _ in range(10):
+        await drain(outbox)
+        (row,) = await rows(writer)
+        assert row.status == "pending"
+        assert row.next_attempt - time.time() <= 60 + 1
+        await make_due(writer)
+
+    await drain(outbox)
+    (row,) = await rows(writer)
+    assert row.status == "sent"
+    assert row.attempts == 11
+    assert len(send.sent) == 1
+
+
+async def test_last_retry_before_deadline(writer):
+    send = FakeSender(failures=1)
+    outbox = make_outbox(writer, send)
+    air_time = datetime.now() - timedelta(seconds=GRACE - 5)
+    await outbox.enqueue(air_time, [batch()])
+
+    await drain(outbox)
+    (row,) = await rows(writer)
+    assert row.status == "pending"
+    assert row.next_attempt <= row.air_time + GRACE
+
+
+async def test_expired_notice_is_not_sent(writer):
+    send = FakeSender()
+    outbox = make_outbox(writer, send)
+    await outbox.enqueue(datetime.now() - timedelta(seconds=GRACE + 60), [batch()])
+
+    assert await drain(outbox) is None
+    (row,) = await rows(writer)
+    assert row.status == "expired"
+    assert send.sent == []
+
+
+async def test_enqueue_large_batch(writer):
+    # 每条 7 个参数，超过 SQLite 单条语句 32766 个变量的上限
+    outbox = make_outbox(writer, FakeSender())
+    await outbox.enqueue(datetime.now(), [batch(str(i)) for i in range(5000)])
+    assert len(await rows(writer)) == 5000
+
+
+async def test_slow_send_does_not_block_later_notices(writer):
+    release = asyncio.Event()
+    sent = []
+
+    async def send(group_id, subscriptions, episodes) -> None:
+        if group_id == "slow":
+            await release.wait()
+        sent.append(group_id)
+
+    outbox = make_outbox(writer, send)
+    outbox.start()
+    try:
+        await outbox.enqueue(datetime.now(), [batch("slow")])
+        await asyncio.sleep(0.1)
+        await outbox.enqueue(datetime.now(), [batch("fast")])
+
+        # 较晚到期的通知在慢的通知发送期间发出，结果立即写回
+        for _ in range(50):
+            if {row.group_id: row.status for row in await rows(writer)}.get(
+                "fast"
+            ) == "sent":
+                break
+            await asyncio.sleep(0.05)
+        statuses = {row.group_id: row.status for row in await rows(writer)}
+        assert statuses == {"slow": "pending", "fast": "sent"}
+        assert sent == ["fast"]
+
+        release.set()
+        for _ in range(50):
+            if all(row.status == "sent" for row in await rows(writer)):
+                break
+            await asyncio.sleep(0.05)
+        assert sent == ["fast", "slow"]
+    finally:
+        await outbox.stop()
+
+
+async def test_send_timeout_is_retried(writer):
+    async def send(group_id, subscriptions, episodes) -> None:
+        await asyncio.Event().wait()
+
+    outbox = make_outbox(writer, send, timeout=0.1)
+    await outbox.enqueue(datetime.now(), [batch()])
+
+    await drain(outbox)
+    (row,) = await rows(writer)
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert row.last_error.startswith("TimeoutError")
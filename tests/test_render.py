@@ -0,0 +1,68 @@
+import pytest
+
+from .utils import make_detail
+
+
+@pytest.fixture
+def plugin():
+    import nonebot_plugin_anime_notification as plugin
+
+    plugin.card_cache.invalidate(1)
+    return plugin
+
+
+async def test_card_without_picture(plugin, monkeypatch):
+    from nonebot_plugin_alconna.uniseg import Image
+    from nonebot_plugin_anime_notification.data_source import build_anime_detail
+
+    async def get(url: str) -> bytes:
+        raise AssertionError("不应请求封面")
+
+    monkeypatch.setattr(plugin.image_cache, "get", get)
+    detail = make_detail(1)
+    del detail["main_picture"]
+    anime_detail = build_anime_detail(detail)
+    assert anime_detail.picture_url is None
+
+    msg = await plugin.build_anime_info_message(anime_detail)
+    assert not msg.has(Image)
+    assert "アニメ 1" in str(msg)
+    assert "观看详情: 未知" in str(msg)
+
+
+async def test_card_falls_back_to_text_when_picture_fails(plugin, monkeypatch):
+    from nonebot_plugin_alconna.uniseg import Image
+    from nonebot_plugin_anime_notification.data_source import build_anime_detail
+
+    async def get(url: str) -> bytes:
+        raise TimeoutError
+
+    monkeypatch.setattr(plugin.image_cache, "get", get)
+    msg = await plugin.build_anime_info_message(build_anime_detail(make_detail(1)))
+    assert not msg.has(Image)
+    assert "アニメ 1" in str(msg)
+
+
+async def test_card_with_picture(plugin, monkeypatch):
+    from nonebot_plugin_alconna.uniseg import Image
+    from nonebot_plugin_anime_notification.data_source import build_anime_detail
+
+    async def get(url: str) -> bytes:
+        assert url == "https://cdn/1l.jpg"
+        return b"image"
+
+    monkeypatch.setattr(plugin.image_cache, "get", get)
+    msg = await plugin.build_anime_info_message(build_anime_detail(make_detail(1)))
+    assert msg[Image, 0].raw == b"image"
+
+
+async def test_card_cache_reuses_card_without_picture(plugin):
+    from nonebot_plugin_anime_notification.data_source import build_anime_detail
+
+    detail = make_detail(1)
+    del detail["main_picture"]
+    anime_detail = build_anime_detail(detail)
+
+    card = plugin.card_cache.get(anime_detail)
+    assert card.picture_url is None
+    assert plugin.card_cache.get(anime_detail) is card
@@ -0,0 +1,72 @@
+import asyncio
+from typing import List, Optional
+
+from multidict import CIMultiDict
+
+
+class FakeHttp:
+    def __init__(self) -> None:
+        self.requests: List[Optional[dict]] = []
+
+    async def get(
+        self, url, *, params=None, headers=None, upstream=None, deadline=None
+    ):
+        from nonebot_plugin_anime_notification.client import Response
+
+        self.requests.append(headers)
+        await asyncio.sleep(0.05)
+        if headers and headers.get("If-None-Match") == '"v1"':
+            return Response(304, CIMultiDict(), b"")
+        return Response(200, CIMultiDict({"ETag": '"v1"'}), b'{"data": []}')
+
+
+def test_request_key():
+    from nonebot_plugin_anime_notification.response_cache import request_key
+
+    assert request_key("https://api/anime?b=2", {"a": 1}) == request_key(
+        "https://api/anime?a=1&b=2"
+    )
+
+
+async def test_concurrent_requests_share_one_fetch():
+    from nonebot_plugin_anime_notification.response_cache import ResponseCache
+
+    http = FakeHttp()
+    cache = ResponseCache(http, 16)  # type: ignore
+    responses = await asyncio.gather(
+        *(cache.get("https://api/anime", params={"q": "a"}, ttl=60) for _ in range(5))
+    )
+    assert len(http.requests) == 1
+    assert all(response.json() == {"data": []} for response in responses)
+
+    await cache.get("https://api/anime", params={"q": "a"}, ttl=60)
+    assert len(http.requests) == 1
+
+
+async def test_stale_entry_is_revalidated():
+    from nonebot_plugin_anime_notification.response_cache import ResponseCache
+
+    http = FakeHttp()
+    cache = ResponseCache(http, 16)  # type: ignore
+    await cache.get("https://api/anime/1", ttl=60)
+    response = await cache.get("https://api/anime/1", ttl=0)
+    assert http.requests[-1] == {"If-None-Match": '"v1"'}
+    assert response.status == 200
+    assert response.json() == {"data": []}
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    from nonebot_plugin_anime_notification.response_cache import ResponseCache
+
+    http = FakeHttp()
+    cache = ResponseCache(http, 16)  # type: ignore
+    leader = asyncio.ensure_future(cache.get("https://api/anime/1", ttl=60))
+    await asyncio.sleep(0)
+    follower = asyncio.ensure_future(cache.get("https://api/anime/1", ttl=60))
+    await asyncio.sleep(0)
+
+    leader.cancel()
+    response = await follower
+    assert response.status == 200
+    assert leader.cancelled()
+    assert len(http.requests) == 1
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.sqlite import insert
+
+from .utils import make_detail
+
+ANIME_ID = 900
+
+
+def make_premiere(start_date: str) -> dict:
+    detail = make_detail(ANIME_ID)
+    detail.update(status="not_yet_aired", start_date=start_date)
+    return detail
+
+
+async def test_check_subscribable(plugin):
+    from nonebot_plugin_anime_notification.data_source import build_anime_detail
+
+    now = datetime(2024, 3, 1)
+    # 开播日期只精确到月时仍可订阅
+    assert (
+        plugin.check_subscribable(build_anime_detail(make_premiere("2024-04")), now)
+        is None
+    )
+    assert (
+        plugin.check_subscribable(build_anime_detail(make_premiere("2024")), now)
+        is None
+    )
+
+    finished = make_detail(ANIME_ID)
+    finished.update(status="finished_airing", end_date="2024-02-01")
+    assert (
+        plugin.check_subscribable(build_anime_detail(finished), now)
+        == "番剧已完结，无法订阅"
+    )
+
+    unknown = make_detail(ANIME_ID)
+    del unknown["broadcast"]
+    assert (
+        plugin.check_subscribable(build_anime_detail(unknown), now)
+        == "番剧放送时间未知，无法订阅"
+    )
+
+
+async def test_unscheduled_subscription_is_scheduled_after_refresh(plugin, monkeypatch):
+    from nonebot_plugin_anime_notification.data_source import (
+        User,
+        AnimeGroup,
+        build_anime_detail,
+    )
+
+    def write(session) -> None:
+        anime_detail = build_anime_detail(make_premiere("2099-04"))
+        anime_detail.last_update = 0
+        session.merge(anime_detail)
+        session.execute(insert(User).values(user_id="10").on_conflict_do_nothing())
+        session.execute(
+            insert(AnimeGroup)
+            .values(user_id="10", anime_id=ANIME_ID, group_id="20")
+            .on_conflict_do_nothing()
+        )
+
+    await plugin.users_writer.submit(write)
+    await plugin.notification.add_notification(
+        {"anime_id": ANIME_ID, "group_id": "20", "user_id": "10", "schedule": None}
+    )
+    assert plugin.notification.upcoming(ANIME_ID) is None
+
+    # 过期的未排期订阅会被刷新
+    refreshed = []
+    monkeypatch.setattr(plugin.detail_refresher, "schedule", refreshed.append)
+    await plugin.refresh_unscheduled_details()
+    assert refreshed == [ANIME_ID]
+
+    # 刷新得到完整的开播日期后排期第 1 集
+    await plugin.save_refreshed_details({ANIME_ID: make_premiere("2099-04-04")})
+    episode = plugin.notification.upcoming(ANIME_ID)
+    assert episode is not None
+    assert episode.number == 1
+
+    await plugin.notification.remove_notification((ANIME_ID, "20", "10"))
@@ -0,0 +1,102 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, create_engine, event, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+
+metadata = MetaData()
+items = Table("items", metadata, Column("id", Integer, primary_key=True))
+
+
+@pytest.fixture
+def engine(tmp_path: Path):
+    from nonebot_plugin_anime_notification.writer import enable_wal
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    enable_wal(engine)
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def make_writer(engine, interval: float = 0.01, max_batch: int = 500):
+    from nonebot_plugin_anime_notification.writer import Writer
+
+    return Writer(
+        "test", sessionmaker(engine, expire_on_commit=False), interval, max_batch
+    )
+
+
+def insert(item_id: int):
+    def mutation(session):
+        session.execute(items.insert().values(id=item_id))
+        return item_id
+
+    return mutation
+
+
+def stored(engine):
+    with engine.connect() as conn:
+        return set(conn.scalars(select(items.c.id)))
+
+
+async def test_concurrent_writes_share_one_commit(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    writer = make_writer(engine)
+    try:
+        results = await asyncio.gather(*(writer.submit(insert(i)) for i in range(20)))
+    finally:
+        await writer.stop()
+
+    assert results == list(range(20))
+    assert stored(engine) == set(range(20))
+    assert len(commits) == 1
+
+
+async def test_max_batch(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    writer = make_writer(engine, max_batch=5)
+    try:
+        await asyncio.gather(*(writer.submit(insert(i)) for i in range(20)))
+    finally:
+        await writer.stop()
+
+    assert stored(engine) == set(range(20))
+    assert len(commits) == 4
+
+
+async def test_failed_mutation_only_fails_itself(engine):
+    writer = make_writer(engine)
+    try:
+        results = await asyncio.gather(
+            writer.submit(insert(1)),
+            writer.submit(insert(1)),
+            writer.submit(insert(2)),
+            return_exceptions=True,
+        )
+    finally:
+        await writer.stop()
+
+    assert results[0] == 1
+    assert isinstance(results[1], IntegrityError)
+    assert results[2] == 2
+    assert stored(engine) == {1, 2}
+
+
+async def test_stop_commits_queued_writes(engine):
+    writer = make_writer(engine, interval=0.1)
+    tasks = [asyncio.create_task(writer.submit(insert(i))) for i in range(3)]
+    await asyncio.sleep(0)
+    await writer.stop()
+
+    assert [task.result() for task in tasks] == [0, 1, 2]
+    assert stored(engine) == {0, 1, 2}
+
+
+async def test_wal_enabled(engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
@@ -0,0 +1,18 @@
+def make_detail(anime_id: int) -> dict:
+    return {
+        "id": anime_id,
+        "title": f"Anime {anime_id}",
+        "main_picture": {"large": f"https://cdn/{anime_id}l.jpg"},
+        "alternative_titles": {"ja": f"アニメ {anime_id}"},
+        "start_date": "2024-01-06",
+        "end_date": "",
+        "synopsis": "",
+        "broadcast": {"day_of_the_week": "saturday", "start_time": "23:30"},
+        "media_type": "tv",
+        "status": "currently_airing",
+        "num_episodes": 12,
+        "start_season": {"year": 2024, "season": "winter"},
+        "source": "manga",
+        "average_episode_duration": 1440,
+        "studios": [],
+    }